@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+合并部署入口：单进程同时挂载 embedding 与 rerank 路由。
+
+两个服务的 utils/ 与 config/loader.py 保持逐行一致，同名模块在进程内只加载一份，
+因此分词器、推理线程池与微批调度器天然共享；配置读取当前目录下的 config/config.{ENV}.yml。
+"""
+
+import time
+
+_T0 = time.perf_counter()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+
+import uvicorn  # noqa: E402
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _service_dir in ("embedding", "rerank"):
+    _path = os.path.join(_ROOT, _service_dir)
+    if _path not in sys.path:
+        sys.path.append(_path)
+
+from config.loader import cfg  # noqa: E402
+from controller.embedding_controller import router as embedding_router  # noqa: E402
+from controller.rerank_controller import router as rerank_router  # noqa: E402
+from utils.admin import build_process_admin_router  # noqa: E402
+from utils.app import create_app, uvicorn_options_from_cfg  # noqa: E402
+from utils.log import build_log_config  # noqa: E402
+from utils.replica import replica_count, run_router  # noqa: E402
+from utils.startup import profile_startup  # noqa: E402
+
+app = create_app(
+    embedding_router, rerank_router, build_process_admin_router(),
+    grpc_services=("embedding", "rerank"), preload=True,
+)
+_APP_IMPORT_SECONDS = time.perf_counter() - _T0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile-startup", action="store_true", help="输出启动耗时分解（导入/加载/预热）后退出")
+    parser.add_argument("--host", help="监听地址，缺省取配置 app.host")
+    parser.add_argument("--port", type=int, help="监听端口，缺省取配置 app.port")
+    parser.add_argument("--replicas", type=int, help="路由模式：启动 N 个本地副本进程并按排队量分发，缺省取配置 router.replicas")
+    args = parser.parse_args()
+    if args.profile_startup:
+        print(json.dumps(profile_startup(_APP_IMPORT_SECONDS), ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    opts = uvicorn_options_from_cfg()
+    host = args.host or opts["host"]
+    port = args.port or opts["port"]
+    replicas = replica_count() if args.replicas is None else args.replicas
+    if replicas > 0:
+        run_router(os.path.abspath(__file__), host, port, replicas, build_log_config(cfg))
+        sys.exit(0)
+
+    uvicorn.run(
+        "server:app",
+        host=host,
+        port=port,
+        workers=opts["workers"],
+        log_config=build_log_config(cfg),
+        access_log=True,
+    )
@@ -4,23 +4,27 @@ from typing import List
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 
-from utils.request import EmbeddingsRequest
+from utils.admin import build_admin_router
+from utils.deadline import RequestCancelled
+from utils.memory import MemoryLimitExceeded
+from utils.executor import run_in_executor, run_cancellable
+from utils.request import EmbeddingsRequest, SimilarityRequest
 from utils.response import success, fail, ResponseCode, ResponseMessage
-from service.embedding_service import embed_texts, token_count
-from config.loader import cfg
+from service.embedding_service import embed_texts, similarity, token_count, model_names, POOLINGS
 
 router = APIRouter()
+router.include_router(build_admin_router("embedding"))
 
 
 @router.post("/v1/embeddings")
 async def embeddings_api(request: Request, body: EmbeddingsRequest):
     try:
-        models_cfg = (cfg.get("embedding") or {}).get("models") or {}
-        model_name = body.model or next(iter(models_cfg.keys()), None)
-        if not model_name or model_name not in models_cfg:
+        models = model_names()
+        model_name = body.model or next(iter(models), None)
+        if not model_name or model_name not in models:
             return JSONResponse(
                 content=fail(
-                    message=f"model 必须在以下范围内：{list(models_cfg.keys())}。",
+                    message=f"model 必须在以下范围内：{models}。",
                     code=ResponseCode.PARAM_FAIL,
                 ),
                 status_code=ResponseCode.PARAM_FAIL,
@@ -37,8 +41,18 @@ async def embeddings_api(request: Request, body: EmbeddingsRequest):
                 status_code=ResponseCode.PARAM_FAIL,
             )
 
-        data = embed_texts(inputs, model_name)
-        count = sum(token_count(inputs, model_name))
+        if body.pooling is not None and body.pooling not in POOLINGS:
+            return JSONResponse(
+                content=fail(
+                    message=ResponseMessage.PARAM_FAIL,
+                    code=ResponseCode.PARAM_FAIL,
+                    data={"errors": [{"loc": ["body", "pooling"], "msg": f"pooling 必须在以下范围内：{sorted(POOLINGS)}"}]},
+                ),
+                status_code=ResponseCode.PARAM_FAIL,
+            )
+
+        data = await run_cancellable(request, embed_texts, inputs, model_name, body.chunking, body.pooling)
+        count = sum(await run_in_executor(token_count, inputs, model_name))
         resp = {
             "data": data,
             "model": model_name,
@@ -46,6 +60,88 @@ async def embeddings_api(request: Request, body: EmbeddingsRequest):
             "usage": {"prompt_tokens": count, "total_tokens": count},
         }
         return JSONResponse(content=success(resp))
+    except MemoryLimitExceeded as e:
+        return JSONResponse(
+            content=fail(message=f"{ResponseMessage.TOO_LARGE}：{e}", code=ResponseCode.TOO_LARGE),
+            status_code=ResponseCode.TOO_LARGE,
+        )
+    except RequestCancelled as e:
+        return JSONResponse(
+            content=fail(message=f"{ResponseMessage.TIMEOUT}：{e.reason}", code=ResponseCode.TIMEOUT),
+            status_code=ResponseCode.TIMEOUT,
+        )
+    except Exception as e:
+        return JSONResponse(
+            content=fail(message=f"{e}", code=ResponseCode.BUSINESS_FAIL),
+            status_code=ResponseCode.BUSINESS_FAIL,
+        )
+
+
+@router.post("/v1/similarity")
+async def similarity_api(request: Request, body: SimilarityRequest):
+    try:
+        models = model_names()
+        model_name = body.model or next(iter(models), None)
+        if not model_name or model_name not in models:
+            return JSONResponse(
+                content=fail(
+                    message=f"model 必须在以下范围内：{models}。",
+                    code=ResponseCode.PARAM_FAIL,
+                ),
+                status_code=ResponseCode.PARAM_FAIL,
+            )
+
+        if not body.queries or not body.texts:
+            return JSONResponse(
+                content=fail(
+                    message=ResponseMessage.PARAM_FAIL,
+                    code=ResponseCode.PARAM_FAIL,
+                    data={"errors": [{"loc": ["body", "queries/texts"], "msg": "queries/texts 不能为空"}]},
+                ),
+                status_code=ResponseCode.PARAM_FAIL,
+            )
+
+        if body.top_k is not None and body.top_k < 1:
+            return JSONResponse(
+                content=fail(
+                    message=ResponseMessage.PARAM_FAIL,
+                    code=ResponseCode.PARAM_FAIL,
+                    data={"errors": [{"loc": ["body", "top_k"], "msg": "top_k 必须大于 0"}]},
+                ),
+                status_code=ResponseCode.PARAM_FAIL,
+            )
+
+        if body.pooling is not None and body.pooling not in POOLINGS:
+            return JSONResponse(
+                content=fail(
+                    message=ResponseMessage.PARAM_FAIL,
+                    code=ResponseCode.PARAM_FAIL,
+                    data={"errors": [{"loc": ["body", "pooling"], "msg": f"pooling 必须在以下范围内：{sorted(POOLINGS)}"}]},
+                ),
+                status_code=ResponseCode.PARAM_FAIL,
+            )
+
+        data = await run_cancellable(
+            request, similarity, body.queries, body.texts, model_name, body.top_k, body.chunking, body.pooling
+        )
+        count = sum(await run_in_executor(token_count, body.queries + body.texts, model_name))
+        resp = {
+            **data,
+            "model": model_name,
+            "object": "similarity",
+            "usage": {"prompt_tokens": count, "total_tokens": count},
+        }
+        return JSONResponse(content=success(resp))
+    except MemoryLimitExceeded as e:
+        return JSONResponse(
+            content=fail(message=f"{ResponseMessage.TOO_LARGE}：{e}", code=ResponseCode.TOO_LARGE),
+            status_code=ResponseCode.TOO_LARGE,
+        )
+    except RequestCancelled as e:
+        return JSONResponse(
+            content=fail(message=f"{ResponseMessage.TIMEOUT}：{e.reason}", code=ResponseCode.TIMEOUT),
+            status_code=ResponseCode.TIMEOUT,
+        )
     except Exception as e:
         return JSONResponse(
             content=fail(message=f"{e}", code=ResponseCode.BUSINESS_FAIL),
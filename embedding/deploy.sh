@@ -10,6 +10,7 @@ TAG="latest"                                                 # 镜像标签
 CONTAINER="embedding"                                        # 容器名
 HOST_PORT=8088                                               # 宿主机外部端口
 APP_PORT=8088                                                # 容器内服务端口
+GRPC_PORT=0                                                  # gRPC 端口（宿主机与容器一致），0 表示不启用
 RESTART_POLICY="always"                                      # 重启策略
 USE_BUILDKIT=true                                            # BuildKit 加速
 MODEL_DIR="$(dirname "$(pwd)")/models/bge-m3"                # 权重模型目录
@@ -50,6 +51,7 @@ echo "DEVICE: ${DEVICE}    GPU_IDS: ${GPU_IDS:-全部}"
 echo "镜像: ${FULL_IMAGE}"
 echo "容器: ${CONTAINER}"
 echo "端口映射: ${HOST_PORT}:${APP_PORT}"
+echo "gRPC 端口: ${GRPC_PORT}"
 echo "模型权重目录: ${MODEL_DIR}"
 echo "BuildKit: ${USE_BUILDKIT}"
 
@@ -86,6 +88,10 @@ if [[ "${DEVICE}" == "cuda" ]]; then
   DOCKER_RUN_ARGS+=("${GPU_ARGS[@]}")
 fi
 
+if [[ "${GRPC_PORT}" != "0" ]]; then
+  DOCKER_RUN_ARGS+=(-e GRPC_PORT="${GRPC_PORT}" -p "${GRPC_PORT}:${GRPC_PORT}")
+fi
+
 docker run -d "${DOCKER_RUN_ARGS[@]}" "${FULL_IMAGE}"
 
 echo "部署完成，查看日志："
@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 
 import os
-from functools import lru_cache
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 
-from FlagEmbedding import FlagModel
+import numpy as np
 
 from config.loader import cfg
-from utils.log import get_logger
+from utils.batcher import get_batcher
+from utils.deadline import check_cancelled
+from utils.engine_cache import load_engine, shared_encoder
+from utils.log import get_logger, log_nowait
+from utils.memory import batch_admission
+from utils.model_pool import get_model_pool
+from utils.singleflight import SingleFlight
+from utils.tokenizer import shared_tokenizer
+
+# FlagEmbedding 会连带导入 torch/transformers，延迟到首次加载模型时再导入，缩短服务启动时间
+if TYPE_CHECKING:
+    from FlagEmbedding import FlagModel
 
 _EMBED = (cfg.get("embedding") or {})
 _MODELS: Dict[str, str] = _EMBED.get("models") or {}
@@ -21,61 +31,208 @@ if _DEVICE not in _ALLOWED:
 # 仅 cuda 支持 fp16
 _USE_FP16 = _DEVICE == "cuda"
 
+# 长文本分块池化：按 token 窗口切分（窗口间重叠），各窗口向量池化为一个向量
+_CHUNKING = (_EMBED.get("chunking") or {})
+_WINDOW_TOKENS = int(_CHUNKING.get("window_tokens", 510))
+_OVERLAP_TOKENS = int(_CHUNKING.get("overlap_tokens", 64))
+POOLINGS = {"mean", "weighted_mean"}
+DEFAULT_POOLING: str = str(_CHUNKING.get("pooling", "mean")).strip().lower()
+if DEFAULT_POOLING not in POOLINGS:
+    raise ValueError(f"embedding.chunking.pooling 仅支持 {POOLINGS}，当前：{DEFAULT_POOLING}")
+if not 0 <= _OVERLAP_TOKENS < _WINDOW_TOKENS:
+    raise ValueError("embedding.chunking 需满足 0 <= overlap_tokens < window_tokens")
 
-@lru_cache(maxsize=1)
-def _load_engines() -> Dict[str, FlagModel]:
+# 编译模式：按序列长度分桶 trace / torch.compile，预热时逐桶编译（见 utils/compiled.py）
+_COMPILE_ENABLED = bool((cfg.get("compile") or {}).get("enabled", False))
+
+# 常驻模型不参与内存预算淘汰，其余模型在首次请求时按需加载
+_PINNED: List[str] = _EMBED.get("pinned") or []
+
+# 相同 (模型, 输入) 的并发请求只计算一次
+_INFLIGHT = SingleFlight()
+
+
+def _build_engine(path: str) -> "FlagModel":
+    from FlagEmbedding import FlagModel
+
+    return FlagModel(
+        model_name_or_path=path,
+        use_fp16=_USE_FP16,
+        device=_DEVICE,
+        local_files_only=True
+    )
+
+
+def _create_engine(name: str, path: str) -> "FlagModel":
     logger = get_logger()
-    engines: Dict[str, FlagModel] = {}
-
-    if logger:
-        import asyncio
-        asyncio.create_task(logger.info({
-            "embedding_init": {
-                "device": _DEVICE,
-                "use_fp16": _USE_FP16,
-                "models": list(_MODELS.keys())
-            }
-        }))
-
-    for name, path in _MODELS.items():
-        try:
-            engines[name] = FlagModel(
-                model_name_or_path=path,
-                use_fp16=_USE_FP16,
-                device=_DEVICE,
-                local_files_only=True
-            )
-            if logger:
-                import asyncio
-                asyncio.create_task(logger.info({
-                    "model_ready": {"name": name, "path": path, "device": _DEVICE, "fp16": _USE_FP16}
-                }))
-        except Exception as e:
-            if logger:
-                import asyncio
-                asyncio.create_task(logger.error({
-                    "model_init_failed": {"name": name, "path": path, "err": str(e)}
-                }))
-            raise RuntimeError(f"模型加载失败: {name}, 错误信息: {e}")
-    return engines
-
-
-def embed_texts(texts: List[str], model_name: str) -> List[Dict[str, Any]]:
-    engines = _load_engines()
-    if model_name not in engines:
-        raise RuntimeError(f"模型未初始化：{model_name}")
-    ef = engines[model_name]
-
-    dense = ef.encode(texts)
+    try:
+        engine = load_engine(("embedding", path, _DEVICE, _USE_FP16), path, lambda: _build_engine(path))
+        # 与进程内同词表的模型共用分词器（合并部署时与 rerank 共用）
+        engine.tokenizer = shared_tokenizer(path, engine.tokenizer)
+        # 与 rerank 的 colbert 引擎（同为 bge-m3）共用编码器权重，仅合并部署时生效
+        engine.model = shared_encoder(path, engine.model, _DEVICE, _USE_FP16)
+        if _COMPILE_ENABLED:
+            from utils.compiled import install_compiled
+
+            install_compiled(engine, "last_hidden_state", _DEVICE, _USE_FP16, engine.tokenizer.pad_token_id)
+        if logger:
+            log_nowait(logger.info({
+                "model_ready": {"name": name, "path": path, "device": _DEVICE, "fp16": _USE_FP16}
+            }))
+        return engine
+    except Exception as e:
+        if logger:
+            log_nowait(logger.error({
+                "model_init_failed": {"name": name, "path": path, "err": str(e)}
+            }))
+        raise RuntimeError(f"模型加载失败: {name}, 错误信息: {e}")
+
+
+def _warmup(engine: "FlagModel") -> Optional[Dict[str, Any]]:
+    engine.encode(["warmup"])
+    if _COMPILE_ENABLED:
+        from utils.compiled import warmup_compiled
+
+        return warmup_compiled(engine)
+    return None
+
+
+get_model_pool().register("embedding", _MODELS, _create_engine, _warmup, pinned=_PINNED)
+
+_logger = get_logger()
+if _logger:
+    log_nowait(_logger.info({
+        "embedding_init": {
+            "device": _DEVICE,
+            "use_fp16": _USE_FP16,
+            "models": list(_MODELS.keys()),
+            "pinned": _PINNED,
+        }
+    }))
+
+
+def model_names() -> List[str]:
+    return get_model_pool().names("embedding")
+
+
+def _engine(model_name: str) -> "FlagModel":
+    return get_model_pool().get("embedding", model_name)
+
+
+def _encode(model_name: str, ef: "FlagModel", texts: List[str]) -> np.ndarray:
+    # 经微批调度器与其他请求合批前向
+    # 批次键带上引擎实例，热切换前后提交的任务不会混入同一批
+    # 启用 admission 时附带各条 token 数与激活内存估算，由调度器按内存上限切分批次
+    return np.asarray(get_batcher().run(
+        ("embedding", model_name, id(ef)), ef.encode, texts, **batch_admission(ef, texts, _USE_FP16)
+    ))
+
+
+def _split_windows(tokenizer, text: str) -> List[Tuple[str, int]]:
+    # 按 token 偏移切回原文片段，返回 [(窗口文本, 窗口 token 数)]
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= _WINDOW_TOKENS:
+        return [(text, len(offsets))]
+
+    windows: List[Tuple[str, int]] = []
+    step = _WINDOW_TOKENS - _OVERLAP_TOKENS
+    for start in range(0, len(offsets), step):
+        end = min(start + _WINDOW_TOKENS, len(offsets))
+        windows.append((text[offsets[start][0]:offsets[end - 1][1]], end - start))
+        if end == len(offsets):
+            break
+    return windows
+
+
+def _pool(vectors: np.ndarray, weights: List[int], pooling: str) -> np.ndarray:
+    if pooling == "weighted_mean":
+        pooled = np.average(vectors, axis=0, weights=np.maximum(weights, 1))
+    else:
+        pooled = vectors.mean(axis=0)
+    # bge 输出为单位向量，池化后重新归一化以保持余弦相似度语义
+    norm = np.linalg.norm(pooled)
+    return pooled / norm if norm > 0 else pooled
+
+
+def _encode_chunked(model_name: str, ef: "FlagModel", texts: List[str], pooling: str) -> np.ndarray:
+    spans = [_split_windows(ef.tokenizer, t) for t in texts]
+    check_cancelled()
+    vectors = _encode(model_name, ef, [w for windows in spans for w, _ in windows])
+
+    pooled = []
+    offset = 0
+    for windows in spans:
+        n = len(windows)
+        pooled.append(_pool(vectors[offset:offset + n], [c for _, c in windows], pooling))
+        offset += n
+    return np.stack(pooled)
+
+
+def _encode_unique(model_name: str, ef: "FlagModel", texts: List[str], chunking: bool, pooling: str) -> np.ndarray:
+    # 相同文本只前向一次，再按原始下标展开
+    unique: Dict[str, int] = {}
+    index = [unique.setdefault(t, len(unique)) for t in texts]
+    if chunking:
+        dense = _encode_chunked(model_name, ef, list(unique), pooling)
+    else:
+        dense = _encode(model_name, ef, list(unique))
+    return dense[index]
+
+
+def embed_dense(texts: List[str], model_name: str, chunking: bool, pooling: str | None) -> np.ndarray:
+    # 返回 N × dim 的归一化向量矩阵，gRPC 接口直接按二进制打包
+    ef = _engine(model_name)
+    pooling = pooling or DEFAULT_POOLING
+
+    return _INFLIGHT.do(
+        (model_name, tuple(texts), chunking, pooling),
+        lambda: _encode_unique(model_name, ef, texts, chunking, pooling),
+    )
+
+
+def embed_texts(
+    texts: List[str],
+    model_name: str,
+    chunking: bool = False,
+    pooling: str | None = None,
+) -> List[Dict[str, Any]]:
+    dense = embed_dense(texts, model_name, chunking, pooling)
 
     return [{"dense": dense.tolist()}]
 
 
+def similarity(
+    queries: List[str],
+    texts: List[str],
+    model_name: str,
+    top_k: int | None = None,
+    chunking: bool = False,
+    pooling: str | None = None,
+) -> Dict[str, Any]:
+    # 两侧合并为一次编码（共享去重、合批与并发合并），向量已归一化，点积即余弦相似度
+    dense = embed_dense(queries + texts, model_name, chunking, pooling)
+    scores = dense[:len(queries)] @ dense[len(queries):].T
+
+    if top_k is None:
+        return {"scores": scores.tolist()}
+
+    k = max(1, min(top_k, len(texts)))
+    # argpartition 取每行前 k 个，再仅对这 k 个排序
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    return {
+        "top_k": [
+            {"indices": idx, "scores": row}
+            for idx, row in zip(top.tolist(), top_scores.tolist())
+        ]
+    }
+
+
 def token_count(texts: List[str], model_name: str) -> List[int]:
-    engines = _load_engines()
-    if model_name not in engines:
-        raise RuntimeError(f"模型未初始化：{model_name}")
-    tokenizer = engines[model_name].tokenizer
+    tokenizer = _engine(model_name).tokenizer
     enc = tokenizer.batch_encode_plus(
         texts, add_special_tokens=False, return_attention_mask=False, return_token_type_ids=False
     )
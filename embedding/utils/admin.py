@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from utils.memory import get_memory_stats
+from utils.model_pool import get_model_pool
+from utils.profiler import ProfileBusy, get_profiler
+from utils.request import ModelLoadRequest, ModelUnloadRequest, ProfileRequest
+from utils.response import success, fail, ResponseCode
+
+
+def build_admin_router(kind: str) -> APIRouter:
+    """模型管理接口（/admin/{kind}/...），鉴权见 utils.app 中的 auth.admin_keys"""
+    router = APIRouter(prefix=f"/admin/{kind}")
+
+    @router.get("/models")
+    async def list_models():
+        return JSONResponse(content=success(get_model_pool().status(kind)))
+
+    @router.post("/models/load")
+    async def load_model(body: ModelLoadRequest):
+        try:
+            get_model_pool().swap(kind, body.name, body.path)
+        except Exception as e:
+            return JSONResponse(
+                content=fail(message=f"{e}", code=ResponseCode.PARAM_FAIL),
+                status_code=ResponseCode.PARAM_FAIL,
+            )
+        return JSONResponse(content=success({"name": body.name, "state": "loading"}))
+
+    @router.post("/models/unload")
+    async def unload_model(body: ModelUnloadRequest):
+        unloaded = get_model_pool().unload(kind, body.name)
+        return JSONResponse(content=success({"name": body.name, "unloaded": unloaded}))
+
+    return router
+
+
+def build_process_admin_router() -> APIRouter:
+    """进程级管理接口（/admin/...），与模型类别无关，每个应用只挂载一次"""
+    router = APIRouter(prefix="/admin")
+
+    @router.get("/memory")
+    async def memory_stats():
+        # 各操作最近批次的预估/实测激活峰值与建议 safety_factor
+        return JSONResponse(content=success(get_memory_stats().snapshot()))
+
+    @router.post("/profile")
+    async def profile(body: ProfileRequest, request: Request):
+        # 阻塞到会话结束后返回 collapsed stacks（可直接用于 flamegraph.pl / speedscope）与 torch 算子排行
+        try:
+            session = get_profiler().start(
+                body.requests, body.seconds, body.interval_ms, body.torch_ops, body.include_idle
+            )
+        except (ValueError, ProfileBusy) as e:
+            return JSONResponse(
+                content=fail(message=f"{e}", code=ResponseCode.PARAM_FAIL),
+                status_code=ResponseCode.PARAM_FAIL,
+            )
+        try:
+            while not session.done.is_set():
+                if await request.is_disconnected():
+                    break
+                await asyncio.sleep(0.1)
+        finally:
+            # finish 需等待微批调度器停止 torch.profiler，放到线程池中执行（不继承本请求的超时令牌）
+            report = await asyncio.get_running_loop().run_in_executor(None, get_profiler().finish, session)
+        return JSONResponse(content=success(report))
+
+    return router
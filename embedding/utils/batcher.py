@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Hashable, List, Optional, Sequence, Tuple
+
+from config.loader import cfg
+from utils.deadline import CancelToken, RequestCancelled, current_token
+from utils.memory import MemoryLimitExceeded, get_memory_stats, memory_limit, track_peak
+from utils.profiler import get_profiler
+
+_DEFAULT_MAX_BATCH_SIZE = 64
+_DEFAULT_MAX_WAIT_MS = 5.0
+
+
+Cost = Callable[[Sequence[int]], int]
+
+
+class _Job:
+    __slots__ = ("key", "runner", "items", "lengths", "cost", "future", "token", "cursor", "done", "results")
+
+    def __init__(self, key: Hashable, runner: Callable[[List[Any]], Sequence[Any]], items: List[Any],
+                 token: Optional[CancelToken], lengths: Optional[List[int]], cost: Optional[Cost]):
+        self.key = key
+        self.runner = runner
+        self.items = items
+        # lengths：各条输入的 token 数；cost：按一批输入的 token 数估算峰值激活内存（字节）
+        self.lengths = lengths
+        self.cost = cost
+        self.future: Future = Future()
+        self.token = token
+        # cursor：已取出执行的条数；done：已得到结果的条数
+        self.cursor = 0
+        self.done = 0
+        self.results: List[Any] = []
+
+
+class MicroBatcher:
+    """
+    跨请求的微批调度器：同一 key（如 模型 + 操作）的任务在 max_wait_ms 内合并为一次 runner 调用，
+    runner 接收拼接后的输入列表，返回等长结果序列，再按提交顺序切分回各任务。
+    所有模型前向都在单个工作线程中串行执行，避免多请求争抢 torch 线程池。
+    超过 max_batch_size 的大任务按批次分段执行；每批执行前丢弃已超时或已取消（客户端断开）的任务。
+    提交时带上 lengths/cost 的任务还受内存上限约束：凑批时预估激活内存超过上限即截断本批，
+    剩余部分留待后续批次；单条即超过上限的任务在提交时直接拒绝。
+    """
+
+    def __init__(self, max_batch_size: int = _DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = _DEFAULT_MAX_WAIT_MS,
+                 memory_limit_bytes: int = 0):
+        self._max_batch_size = max(1, int(max_batch_size))
+        self._max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._memory_limit = max(0, int(memory_limit_bytes))
+        self._cond = threading.Condition()
+        self._queue: Deque[_Job] = deque()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, key: Hashable, runner: Callable[[List[Any]], Sequence[Any]], items: List[Any],
+               lengths: Optional[List[int]] = None, cost: Optional[Cost] = None) -> Future:
+        job = _Job(key, runner, list(items), current_token(), lengths, cost)
+        if not job.items:
+            job.future.set_result([])
+            return job.future
+        if self._memory_limit and lengths and cost is not None:
+            need = cost([max(lengths)])
+            if need > self._memory_limit:
+                raise MemoryLimitExceeded(need, self._memory_limit)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+                self._thread.start()
+            self._queue.append(job)
+            self._cond.notify_all()
+        return job.future
+
+    def run(self, key: Hashable, runner: Callable[[List[Any]], Sequence[Any]], items: List[Any],
+            lengths: Optional[List[int]] = None, cost: Optional[Cost] = None) -> Sequence[Any]:
+        return self.submit(key, runner, items, lengths, cost).result()
+
+    def _pending(self, key: Hashable) -> int:
+        return sum(len(job.items) - job.cursor for job in self._queue if job.key == key)
+
+    def _drop_cancelled(self) -> None:
+        for job in list(self._queue):
+            if job.token is not None and job.token.expired():
+                self._queue.remove(job)
+                job.future.set_exception(RequestCancelled(job.token.reason or "cancelled"))
+
+    def _take(self) -> List[Tuple[_Job, int, int]]:
+        with self._cond:
+            while True:
+                self._drop_cancelled()
+                if self._queue:
+                    break
+                self._cond.wait()
+
+            head = self._queue[0]
+            deadline = time.monotonic() + self._max_wait
+            while self._pending(head.key) < self._max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._drop_cancelled()
+
+            # 按提交顺序取同 key 任务的剩余部分，凑满 max_batch_size 或达到内存上限为止，大任务可只取一段
+            batch: List[Tuple[_Job, int, int]] = []
+            lengths: List[int] = []
+            total = 0
+            for job in list(self._queue):
+                if job.key != head.key:
+                    continue
+                n = min(len(job.items) - job.cursor, self._max_batch_size - total)
+                full = False
+                if self._memory_limit and job.lengths is not None and job.cost is not None:
+                    fit = self._fit(job, n, lengths)
+                    full = fit < n
+                    n = fit
+                if n <= 0:
+                    break
+                batch.append((job, job.cursor, job.cursor + n))
+                job.cursor += n
+                total += n
+                if job.cursor == len(job.items):
+                    self._queue.remove(job)
+                if full:
+                    break
+            return batch
+
+    def _fit(self, job: _Job, n: int, lengths: List[int]) -> int:
+        # 逐条加入本批，直到预估峰值超过上限；空批至少取一条（提交时已保证单条可容纳）
+        k = 0
+        while k < n:
+            length = job.lengths[job.cursor + k]
+            if lengths and job.cost(lengths + [length]) > self._memory_limit:
+                break
+            lengths.append(length)
+            k += 1
+        return k
+
+    def _fail(self, batch: List[Tuple[_Job, int, int]], e: Exception) -> None:
+        with self._cond:
+            for job, _, _ in batch:
+                if job in self._queue:
+                    self._queue.remove(job)
+        for job, _, _ in batch:
+            if not job.future.done():
+                job.future.set_exception(e)
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._take()
+            if not batch:
+                continue
+            items = [item for job, start, end in batch for item in job.items[start:end]]
+            head = batch[0][0]
+            try:
+                # 剖析会话期间每批前向记录 torch 算子耗时（见 utils/profiler.py）
+                with get_profiler().record():
+                    if head.cost is not None and all(job.lengths is not None for job, _, _ in batch):
+                        # 记录每批预估与实测峰值，供校准 admission.safety_factor
+                        lengths = [n for job, start, end in batch for n in job.lengths[start:end]]
+                        with track_peak() as peak:
+                            results = head.runner(items)
+                        op = head.key[0] if isinstance(head.key, tuple) else head.key
+                        get_memory_stats().record(str(op), lengths, head.cost(lengths), peak["peak"])
+                    else:
+                        results = head.runner(items)
+            except Exception as e:
+                self._fail(batch, e)
+                continue
+
+            offset = 0
+            for job, start, end in batch:
+                n = end - start
+                job.results.extend(results[offset:offset + n])
+                job.done += n
+                offset += n
+                if job.done == len(job.items) and not job.future.done():
+                    job.future.set_result(job.results)
+
+
+_batcher: Optional[MicroBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> MicroBatcher:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            batching_cfg = (cfg.get("batching") or {})
+            _batcher = MicroBatcher(
+                max_batch_size=batching_cfg.get("max_batch_size", _DEFAULT_MAX_BATCH_SIZE),
+                max_wait_ms=batching_cfg.get("max_wait_ms", _DEFAULT_MAX_WAIT_MS),
+                memory_limit_bytes=memory_limit(),
+            )
+        return _batcher
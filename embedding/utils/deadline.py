@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import contextvars
+import threading
+import time
+from typing import Optional
+
+from fastapi import Request
+
+from config.loader import cfg
+
+# 请求超时：优先读取请求头（毫秒），其次配置 app.request_timeout_ms，0 表示不设超时
+TIMEOUT_HEADER = "x-request-timeout-ms"
+
+
+class RequestCancelled(Exception):
+    """请求已超时或客户端已断开，尚未执行的推理直接丢弃"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    def __init__(self, deadline: Optional[float] = None, parent: Optional["CancelToken"] = None):
+        self.deadline = deadline
+        # 父令牌失效时子令牌随之失效（如 gRPC 流内各条消息的令牌从属于整个流）
+        self.parent = parent
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str) -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def expired(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.parent is not None and self.parent.expired():
+            self.cancel(self.parent.reason or "cancelled")
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline_exceeded")
+            return True
+        return False
+
+    def check(self) -> None:
+        if self.expired():
+            raise RequestCancelled(self.reason or "cancelled")
+
+
+_current: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("cancel_token", default=None)
+
+
+def new_token(timeout_ms: float = 0.0, parent: Optional[CancelToken] = None) -> CancelToken:
+    """timeout_ms <= 0 时取配置 app.request_timeout_ms"""
+    if timeout_ms <= 0:
+        timeout_ms = float((cfg.get("app") or {}).get("request_timeout_ms", 0) or 0)
+    return CancelToken(time.monotonic() + timeout_ms / 1000.0 if timeout_ms > 0 else None, parent)
+
+
+def request_token(request: Request) -> CancelToken:
+    timeout_ms = 0.0
+    header = request.headers.get(TIMEOUT_HEADER)
+    if header:
+        try:
+            timeout_ms = float(header)
+        except ValueError:
+            timeout_ms = 0.0
+    return new_token(timeout_ms)
+
+
+def bind_token(token: Optional[CancelToken]) -> None:
+    _current.set(token)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current.get()
+
+
+def check_cancelled() -> None:
+    token = _current.get()
+    if token is not None:
+        token.check()
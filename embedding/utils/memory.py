@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.loader import cfg
+
+_MB = 1024 * 1024
+_ADMISSION = (cfg.get("admission") or {})
+_ENABLED = bool(_ADMISSION.get("enabled", False))
+_LIMIT_BYTES = int(_ADMISSION.get("memory_limit_mb", 0)) * _MB
+_SAFETY_FACTOR = float(_ADMISSION.get("safety_factor", 1.0))
+_HISTORY = max(1, int(_ADMISSION.get("history", 256)))
+# CPU 上以 RSS 采样近似批次峰值，采样间隔（秒）
+_SAMPLE_INTERVAL = 0.002
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryLimitExceeded(Exception):
+    """单条输入的预计激活内存已超过上限，无论如何拆分都无法执行"""
+
+    def __init__(self, need: int, limit: int):
+        super().__init__(
+            f"单条输入预计激活内存 {need / _MB:.0f}MB 超过上限 {limit / _MB:.0f}MB，请缩短输入或开启分块（chunking/passages）"
+        )
+        self.need = need
+        self.limit = limit
+
+
+def memory_limit() -> int:
+    """单批前向的激活内存上限（字节），0 表示不限制"""
+    return _LIMIT_BYTES if _ENABLED else 0
+
+
+def _model_config(engine: Any) -> Any:
+    # FlagModel / FlagReranker 的 model 为 transformers 模型，BGEM3FlagModel 外面还包了一层
+    model = getattr(engine, "model", None)
+    while model is not None and not hasattr(getattr(model, "config", None), "hidden_size"):
+        model = getattr(model, "model", None)
+    if model is None:
+        raise RuntimeError("无法读取模型结构配置，不能估算激活内存")
+    return model.config
+
+
+class ActivationCost:
+    """
+    按 token 数估算一批输入前向时的峰值激活内存。推理不保留各层激活，峰值出现在单层内：
+    每个 token 约 7 × hidden（残差、QKV、注意力输出）+ 2 × intermediate（FFN）个元素，
+    再加 2 × heads × L × L 的注意力分数与概率；批内按最长输入补齐，超出模型最大长度的部分会被截断。
+    """
+
+    def __init__(self, engine: Any, use_fp16: bool):
+        config = _model_config(engine)
+        self._hidden = int(config.hidden_size)
+        self._heads = int(config.num_attention_heads)
+        self._intermediate = int(getattr(config, "intermediate_size", None) or 4 * self._hidden)
+        self._max_length = int(
+            getattr(engine, "passage_max_length", None)
+            or getattr(engine, "max_length", None)
+            or config.max_position_embeddings
+        )
+        self._bytes = 2 if use_fp16 else 4
+
+    def __call__(self, lengths: Sequence[int]) -> int:
+        if not lengths:
+            return 0
+        length = min(max(lengths), self._max_length)
+        per_seq = length * (7 * self._hidden + 2 * self._intermediate) + 2 * self._heads * length * length
+        return int(len(lengths) * per_seq * self._bytes * _SAFETY_FACTOR)
+
+
+def batch_admission(engine: Any, inputs: List[Any], use_fp16: bool) -> Dict[str, Any]:
+    """
+    返回传给 MicroBatcher.submit 的 lengths 与 cost（inputs 为文本或 [query, passage] 对）；
+    未启用 admission 时返回空字典，不额外分词。
+    """
+    if not _ENABLED or not inputs:
+        return {}
+    tokenizer = engine.tokenizer
+    kwargs = {"return_attention_mask": False, "return_token_type_ids": False}
+    if isinstance(inputs[0], (list, tuple)):
+        enc = tokenizer([q for q, _ in inputs], [p for _, p in inputs], **kwargs)
+    else:
+        enc = tokenizer(list(inputs), **kwargs)
+    return {"lengths": [len(ids) for ids in enc["input_ids"]], "cost": ActivationCost(engine, use_fp16)}
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _cuda_active() -> bool:
+    torch = sys.modules.get("torch")
+    return torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized()
+
+
+@contextmanager
+def track_peak() -> Iterator[Dict[str, int]]:
+    """
+    统计代码块执行期间的峰值内存增量：CUDA 取显存分配峰值；CPU 由后台线程采样 RSS。
+    glibc 会复用已释放的堆内存，RSS 增量可能偏低，校准时以近期最大值为准。
+    """
+    result = {"peak": 0}
+    if _cuda_active():
+        import torch
+
+        torch.cuda.reset_peak_memory_stats()
+        base = torch.cuda.memory_allocated()
+        try:
+            yield result
+        finally:
+            result["peak"] = max(0, torch.cuda.max_memory_allocated() - base)
+        return
+
+    base = _rss_bytes()
+    peak = [base]
+    stop = threading.Event()
+
+    def _sample() -> None:
+        while not stop.wait(_SAMPLE_INTERVAL):
+            peak[0] = max(peak[0], _rss_bytes())
+
+    sampler = threading.Thread(target=_sample, name="rss-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield result
+    finally:
+        stop.set()
+        sampler.join()
+        result["peak"] = max(0, max(peak[0], _rss_bytes()) - base)
+
+
+class MemoryStats:
+    """按操作（批次键首项，如 embedding / rerank / colbert）记录最近批次的预估与实测峰值，用于校准 safety_factor"""
+
+    def __init__(self, history: int = _HISTORY):
+        self._lock = threading.Lock()
+        self._history = history
+        # op -> [(批大小, 最长 token 数, 预估字节, 实测字节)]
+        self._records: Dict[str, Deque[Tuple[int, int, int, int]]] = {}
+
+    def record(self, op: str, lengths: Sequence[int], estimated: int, measured: int) -> None:
+        with self._lock:
+            records = self._records.setdefault(op, deque(maxlen=self._history))
+            records.append((len(lengths), max(lengths), estimated, measured))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            ops = {op: list(records) for op, records in self._records.items()}
+
+        summary: Dict[str, Any] = {}
+        for op, records in ops.items():
+            ratios = sorted(m / e for _, _, e, m in records if e > 0)
+            max_ratio: Optional[float] = ratios[-1] if ratios else None
+            summary[op] = {
+                "batches": len(records),
+                "peak_measured_mb": round(max(m for _, _, _, m in records) / _MB, 1),
+                "peak_estimated_mb": round(max(e for _, _, e, _ in records) / _MB, 1),
+                "ratio_p50": round(ratios[len(ratios) // 2], 3) if ratios else None,
+                "ratio_max": round(max_ratio, 3) if max_ratio is not None else None,
+                # 实测/预估的最大比值乘以当前系数，即可让预估覆盖近期所有批次
+                "suggested_safety_factor": round(_SAFETY_FACTOR * max_ratio, 3) if max_ratio else None,
+                "recent": [
+                    {"batch": b, "max_tokens": t, "estimated_mb": round(e / _MB, 1), "measured_mb": round(m / _MB, 1)}
+                    for b, t, e, m in records[-20:]
+                ],
+            }
+        return {
+            "enabled": _ENABLED,
+            "memory_limit_mb": _LIMIT_BYTES // _MB,
+            "safety_factor": _SAFETY_FACTOR,
+            "ops": summary,
+        }
+
+
+_stats: Optional[MemoryStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_memory_stats() -> MemoryStats:
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = MemoryStats()
+        return _stats
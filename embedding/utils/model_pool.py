@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config.loader import cfg
+from utils.log import get_logger, log_nowait
+
+_WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt")
+
+
+def _estimate_bytes(path: str) -> int:
+    # 加载前按权重文件大小估算占用，用于提前腾出内存
+    total = 0
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            if name.endswith(_WEIGHT_SUFFIXES):
+                total += os.path.getsize(os.path.join(path, name))
+    return total
+
+
+def _engine_bytes(engine: Any, default: int) -> int:
+    # 加载后按实际参数与缓冲区大小统计
+    model = getattr(engine, "model", None)
+    if model is None or not hasattr(model, "parameters"):
+        return default
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors) or default
+
+
+class _Kind:
+    __slots__ = ("models", "factory", "warmup", "pinned")
+
+    def __init__(self, models: Dict[str, str], factory: Callable[[str, str], Any],
+                 warmup: Optional[Callable[[Any], Optional[Dict[str, Any]]]], pinned: Iterable[str]):
+        self.models = dict(models)
+        self.factory = factory
+        self.warmup = warmup
+        self.pinned = set(pinned)
+
+
+class _Entry:
+    __slots__ = ("engine", "path", "nbytes", "last_used", "loaded_at", "timings")
+
+    def __init__(self, engine: Any, path: str, nbytes: int, timings: Dict[str, Any]):
+        self.engine = engine
+        self.path = path
+        self.nbytes = nbytes
+        self.last_used = time.monotonic()
+        self.loaded_at = time.time()
+        self.timings = timings
+
+
+class ModelPool:
+    """
+    进程内模型池（合并部署时 embedding 与 rerank 共用一个内存预算）：
+    - 按需加载：模型在首次请求时加载；
+    - 内存预算：已加载模型总占用超过 memory_budget_mb 时按最近最少使用淘汰非常驻模型；
+    - 热切换：后台加载并预热新版本，完成后原子替换，切换期间旧版本继续服务。
+    """
+
+    def __init__(self, memory_budget_bytes: int = 0):
+        self._budget = max(0, int(memory_budget_bytes))
+        self._lock = threading.RLock()
+        self._kinds: Dict[str, _Kind] = {}
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._swaps: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def register(self, kind: str, models: Dict[str, str], factory: Callable[[str, str], Any],
+                 warmup: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None,
+                 pinned: Iterable[str] = ()) -> None:
+        with self._lock:
+            self._kinds[kind] = _Kind(models, factory, warmup, pinned)
+
+    def kinds(self) -> List[str]:
+        with self._lock:
+            return list(self._kinds.keys())
+
+    def names(self, kind: str) -> List[str]:
+        with self._lock:
+            return list(self._kinds[kind].models.keys())
+
+    def pinned(self, kind: str) -> List[str]:
+        with self._lock:
+            spec = self._kinds[kind]
+            return [name for name in spec.models if name in spec.pinned]
+
+    def get(self, kind: str, name: str) -> Any:
+        return self._get(kind, name, warmup=False).engine
+
+    def preload(self, kind: str, name: str) -> Dict[str, Any]:
+        """加载并预热模型（已加载时直接返回），返回加载与预热耗时及预热附加报告"""
+        return dict(self._get(kind, name, warmup=True).timings)
+
+    def _get(self, kind: str, name: str, warmup: bool) -> _Entry:
+        key = (kind, name)
+        with self._lock:
+            spec = self._kinds[kind]
+            if name not in spec.models:
+                raise RuntimeError(f"模型未初始化：{name}")
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                return entry
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # 同一模型只加载一次，其余请求等待加载完成；热切换替换条目时也持有同一把锁
+        with load_lock:
+            while True:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        entry.last_used = time.monotonic()
+                        return entry
+                    path = spec.models[name]
+                entry = self._load(kind, name, path, warmup=warmup)
+                with self._lock:
+                    # 加载期间路径已被切换时丢弃旧版本，按新路径重新取
+                    if spec.models.get(name) != path:
+                        continue
+                    self._entries[key] = entry
+                    self._evict(exclude=key)
+                return entry
+
+    def swap(self, kind: str, name: str, path: Optional[str] = None) -> Future:
+        """后台加载并预热 name 的新版本（path 缺省为当前路径，可用于新增模型），就绪后原子切换"""
+        key = (kind, name)
+        with self._lock:
+            spec = self._kinds[kind]
+            path = path or spec.models.get(name)
+            if not path:
+                raise RuntimeError(f"新增模型需指定 path：{name}")
+            if (self._swaps.get(key) or {}).get("state") == "loading":
+                raise RuntimeError(f"模型正在切换中：{name}")
+            self._swaps[key] = {"state": "loading", "path": path, "started_at": time.time()}
+
+        fut: Future = Future()
+
+        def _run():
+            try:
+                entry = self._load(kind, name, path, warmup=True)
+                with self._lock:
+                    load_lock = self._load_locks.setdefault(key, threading.Lock())
+                # 等待进行中的按需加载结束后再替换，避免其以旧版本覆盖新条目
+                with load_lock, self._lock:
+                    old = self._entries.get(key)
+                    spec.models[name] = path
+                    self._entries[key] = entry
+                    self._swaps[key] = {"state": "ready", "path": path, "finished_at": time.time()}
+                    self._evict(exclude=key)
+                self._log("info", {"model_swapped": {
+                    "kind": kind, "name": name, "path": path,
+                    "previous_path": old.path if old else None,
+                }})
+                fut.set_result(path)
+            except Exception as e:
+                with self._lock:
+                    self._swaps[key] = {"state": "failed", "path": path, "err": str(e), "finished_at": time.time()}
+                self._log("error", {"model_swap_failed": {"kind": kind, "name": name, "path": path, "err": str(e)}})
+                fut.set_exception(e)
+
+        threading.Thread(target=_run, name=f"model-swap-{kind}-{name}", daemon=True).start()
+        return fut
+
+    def unload(self, kind: str, name: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop((kind, name), None)
+        if entry is not None:
+            self._log("info", {"model_unloaded": {"kind": kind, "name": name, "path": entry.path}})
+        return entry is not None
+
+    def status(self, kind: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            spec = self._kinds[kind]
+            # 正在新增（尚未切换完成）的模型也一并列出
+            names = list(spec.models) + [n for k, n in self._swaps if k == kind and n not in spec.models]
+            items = []
+            for name in names:
+                entry = self._entries.get((kind, name))
+                items.append({
+                    "name": name,
+                    "path": spec.models.get(name),
+                    "pinned": name in spec.pinned,
+                    "loaded": entry is not None,
+                    "bytes": entry.nbytes if entry else None,
+                    "loaded_at": entry.loaded_at if entry else None,
+                    "timings": entry.timings if entry else None,
+                    "swap": self._swaps.get((kind, name)),
+                })
+            return items
+
+    def _load(self, kind: str, name: str, path: str, warmup: bool) -> _Entry:
+        spec = self._kinds[kind]
+        estimate = _estimate_bytes(path)
+        with self._lock:
+            # 热切换时旧版本需继续服务至切换完成，不参与本次淘汰
+            self._evict(reserve=estimate, exclude=(kind, name))
+
+        start = time.perf_counter()
+        engine = spec.factory(name, path)
+        loaded = time.perf_counter()
+        # 预热可返回附加报告（如各长度桶的编译耗时与加速比），一并记入 timings
+        extra = spec.warmup(engine) if warmup and spec.warmup is not None else None
+        timings: Dict[str, Any] = {"load": round(loaded - start, 3), "warmup": round(time.perf_counter() - loaded, 3)}
+        timings.update(extra or {})
+        entry = _Entry(engine, path, _engine_bytes(engine, estimate), timings)
+        self._log("info", {"model_loaded": {
+            "kind": kind, "name": name, "path": path, "bytes": entry.nbytes, **timings,
+        }})
+        return entry
+
+    def _evict(self, reserve: int = 0, exclude: Optional[Tuple[str, str]] = None) -> None:
+        # 调用方需持有 self._lock
+        if not self._budget:
+            return
+        while sum(e.nbytes for e in self._entries.values()) + reserve > self._budget:
+            candidates = [
+                (entry.last_used, key) for key, entry in self._entries.items()
+                if key != exclude and key[1] not in self._kinds[key[0]].pinned
+            ]
+            if not candidates:
+                return
+            _, key = min(candidates)
+            entry = self._entries.pop(key)
+            self._log("info", {"model_evicted": {"kind": key[0], "name": key[1], "path": entry.path, "bytes": entry.nbytes}})
+
+    @staticmethod
+    def _log(level: str, data: Dict[str, Any]) -> None:
+        logger = get_logger()
+        if logger:
+            log_nowait(getattr(logger, level)(data))
+
+
+_pool: Optional[ModelPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool() -> ModelPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool_cfg = (cfg.get("model_pool") or {})
+            _pool = ModelPool(memory_budget_bytes=int(pool_cfg.get("memory_budget_mb", 0)) * 1024 * 1024)
+        return _pool
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from config.loader import cfg
+from utils.deadline import RequestCancelled
+from utils.log import get_logger, log_nowait
+from utils.response import fail, success, ResponseCode, ResponseMessage
+
+# httpx 仅路由进程使用，延迟到创建客户端时导入，普通启动不付出导入开销
+if TYPE_CHECKING:
+    import httpx
+
+_ROUTER = (cfg.get("router") or {})
+_SUB_BATCH_SIZE = max(1, int(_ROUTER.get("sub_batch_size", 32)))
+_STARTUP_TIMEOUT = float(_ROUTER.get("startup_timeout_s", 300))
+_REPLICA_HOST = "127.0.0.1"
+# 只转发鉴权、超时与内容类型，其余请求头由 httpx 重新生成
+_FORWARD_HEADERS = {"authorization", "x-request-timeout-ms", "content-type"}
+
+Part = Tuple[Dict[str, Any], int]
+
+
+def replica_count() -> int:
+    return max(0, int(_ROUTER.get("replicas", 0)))
+
+
+def _tokens(text: Any) -> int:
+    # 路由进程不加载分词器，按字符数估算 token 数，仅用于比较各副本的排队量
+    return len(text) if isinstance(text, str) else 1
+
+
+def _request_tokens(payload: Any, body: bytes) -> int:
+    # 整体转发的请求按所有文本字段估算；rerank 每个候选都与 query 拼接一次
+    if not isinstance(payload, dict):
+        return len(body)
+    total = 0
+    for field in ("input", "queries", "texts", "documents"):
+        items = payload.get(field)
+        if isinstance(items, list):
+            total += sum(_tokens(t) for t in items)
+    documents = payload.get("documents")
+    if isinstance(documents, list):
+        total += _tokens(payload.get("query")) * len(documents)
+    return total or len(body)
+
+
+def _chunks(items: List[Any]) -> List[Tuple[int, List[Any]]]:
+    return [(start, items[start:start + _SUB_BATCH_SIZE]) for start in range(0, len(items), _SUB_BATCH_SIZE)]
+
+
+def _split_embeddings(payload: Dict[str, Any]) -> Optional[List[Part]]:
+    inputs = payload.get("input")
+    if not isinstance(inputs, list) or len(inputs) <= _SUB_BATCH_SIZE:
+        return None
+    return [({**payload, "input": chunk}, sum(_tokens(t) for t in chunk)) for _, chunk in _chunks(inputs)]
+
+
+def _merge_embeddings(payload: Dict[str, Any], datas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    dense = [vec for data in datas for vec in data["data"][0]["dense"]]
+    prompt_tokens = sum(data["usage"]["prompt_tokens"] for data in datas)
+    return {
+        **datas[0],
+        "data": [{"dense": dense}],
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+
+def _split_rerank(payload: Dict[str, Any]) -> Optional[List[Part]]:
+    documents = payload.get("documents")
+    # 级联预筛的 shortlist 针对全体候选，拆分后语义不同，整体转发
+    if payload.get("cascade") or not isinstance(documents, list) or len(documents) <= _SUB_BATCH_SIZE:
+        return None
+    embeddings = payload.get("document_embeddings")
+    query_tokens = _tokens(payload.get("query"))
+    parts: List[Part] = []
+    for start, chunk in _chunks(documents):
+        part = {**payload, "documents": chunk, "top_n": None}
+        if isinstance(embeddings, list):
+            part["document_embeddings"] = embeddings[start:start + len(chunk)]
+        parts.append((part, sum(query_tokens + _tokens(d) for d in chunk)))
+    return parts
+
+
+def _merge_rerank(payload: Dict[str, Any], datas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # 各子批次的 index 为批内下标，按子批次起点还原为原始下标后统一排序
+    results = []
+    for i, data in enumerate(datas):
+        for item in data["results"]:
+            results.append({**item, "index": item["index"] + i * _SUB_BATCH_SIZE})
+    results.sort(key=lambda x: x["relevance_score"], reverse=True)
+    top_n = payload.get("top_n")
+    if top_n is not None:
+        results = results[:max(0, int(top_n))]
+    return {"id": str(uuid.uuid4()), "results": results}
+
+
+# 可拆分的接口：path -> (拆分, 合并)
+_SPLITTERS: Dict[str, Tuple[Callable[[Dict[str, Any]], Optional[List[Part]]], Callable[..., Dict[str, Any]]]] = {
+    "/v1/embeddings": (_split_embeddings, _merge_embeddings),
+    "/v1/rerank": (_split_rerank, _merge_rerank),
+}
+
+
+class _Replica:
+    __slots__ = ("url", "queued_tokens", "inflight")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.queued_tokens = 0
+        self.inflight = 0
+
+
+class ReplicaRouter:
+    """
+    本地副本路由：大请求按 sub_batch_size 拆为子批次，每个子批次发往排队 token 数最少的副本，
+    结果按原始顺序拼回；其余接口整体转发给最空闲的副本，管理接口（/admin/）广播到所有副本。
+    排队量只在事件循环线程中读写，无需加锁。
+    """
+
+    def __init__(self, ports: List[int]):
+        self._replicas = [_Replica(f"http://{_REPLICA_HOST}:{port}") for port in ports]
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _http(self) -> "httpx.AsyncClient":
+        # 超时由副本按 X-Request-Timeout-Ms 控制，客户端不另设超时
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(timeout=None)
+        return self._client
+
+    async def _send(self, method: str, path: str, content: bytes, headers: Dict[str, str],
+                    tokens: int, replica: Optional[_Replica] = None) -> "httpx.Response":
+        if replica is None:
+            replica = min(self._replicas, key=lambda r: (r.queued_tokens, r.inflight))
+        replica.queued_tokens += tokens
+        replica.inflight += 1
+        try:
+            return await self._http().request(method, replica.url + path, content=content, headers=headers)
+        finally:
+            replica.queued_tokens -= tokens
+            replica.inflight -= 1
+
+    @staticmethod
+    async def _gather(request: Request, aws: List[Awaitable["httpx.Response"]]) -> List["httpx.Response"]:
+        # 客户端断开时取消所有子请求，副本随之感知连接断开并丢弃排队中的推理
+        task = asyncio.ensure_future(asyncio.gather(*aws))
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=0.1)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise RequestCancelled("client_disconnected")
+
+    async def handle(self, request: Request) -> Response:
+        try:
+            path = request.url.path
+            headers = {k: v for k, v in request.headers.items() if k.lower() in _FORWARD_HEADERS}
+            if request.url.query:
+                path = f"{path}?{request.url.query}"
+            body = await request.body()
+
+            if request.url.path.startswith("/admin/"):
+                return await self._broadcast(request, path, body, headers)
+
+            payload = _json_or_none(body) if request.method == "POST" else None
+            splitter = _SPLITTERS.get(request.url.path) if isinstance(payload, dict) else None
+            parts = splitter[0](payload) if splitter else None
+            if not parts:
+                tokens = _request_tokens(payload, body)
+                resp = (await self._gather(request, [self._send(request.method, path, body, headers, tokens)]))[0]
+                return _passthrough(resp)
+
+            responses = await self._gather(request, [
+                self._send("POST", path, json.dumps(part, ensure_ascii=False).encode("utf-8"), headers, tokens)
+                for part, tokens in parts
+            ])
+            for resp in responses:
+                if resp.status_code != ResponseCode.SUCCESS:
+                    return _passthrough(resp)
+            merged = splitter[1](payload, [resp.json()["data"] for resp in responses])
+            return JSONResponse(content=success(merged))
+
+        except RequestCancelled as e:
+            return JSONResponse(
+                content=fail(message=f"{ResponseMessage.TIMEOUT}：{e.reason}", code=ResponseCode.TIMEOUT),
+                status_code=ResponseCode.TIMEOUT,
+            )
+        except Exception as e:
+            return JSONResponse(
+                content=fail(message=f"{e}", code=ResponseCode.BUSINESS_FAIL),
+                status_code=ResponseCode.BUSINESS_FAIL,
+            )
+
+    async def _broadcast(self, request: Request, path: str, body: bytes, headers: Dict[str, str]) -> Response:
+        responses = await self._gather(request, [
+            self._send(request.method, path, body, headers, 0, replica=r) for r in self._replicas
+        ])
+        replicas = []
+        for replica, resp in zip(self._replicas, responses):
+            replicas.append({"url": replica.url, "status": resp.status_code, "body": _json_or_none(resp.content)})
+        return JSONResponse(content=success({"replicas": replicas}))
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [{"url": r.url, "queued_tokens": r.queued_tokens, "inflight": r.inflight} for r in self._replicas]
+
+
+def _json_or_none(content: bytes) -> Any:
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+def _passthrough(resp: "httpx.Response") -> Response:
+    return Response(content=resp.content, status_code=resp.status_code, media_type=resp.headers.get("content-type"))
+
+
+def create_router_app(ports: List[int]) -> FastAPI:
+    from utils.app import create_app
+
+    replica_router = ReplicaRouter(ports)
+    api = APIRouter()
+
+    @api.get("/router/replicas")
+    async def replicas_api():
+        return JSONResponse(content=success(replica_router.status()))
+
+    api.add_api_route("/{path:path}", replica_router.handle, methods=["GET", "POST"])
+    return create_app(api)
+
+
+def _wait_ready(procs: List[subprocess.Popen], ports: List[int]) -> None:
+    deadline = time.monotonic() + _STARTUP_TIMEOUT
+    for proc, port in zip(procs, ports):
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"副本进程已退出：{_REPLICA_HOST}:{port}，退出码 {proc.returncode}")
+            try:
+                socket.create_connection((_REPLICA_HOST, port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"副本启动超时：{_REPLICA_HOST}:{port}")
+                time.sleep(0.5)
+
+
+def run_router(script: str, host: str, port: int, count: int, log_config: Dict[str, Any]) -> None:
+    """以子进程启动 count 个副本（仅监听本机，端口自 router.base_port 起递增），就绪后在 host:port 提供路由"""
+    import uvicorn
+
+    base_port = int(_ROUTER.get("base_port") or port + 1)
+    ports = [base_port + i for i in range(count)]
+    # 副本只服务路由转发，不启用 gRPC，避免争用同一端口
+    env = {**os.environ, "GRPC_PORT": "0"}
+    procs = [
+        subprocess.Popen([sys.executable, script, "--replicas", "0", "--host", _REPLICA_HOST, "--port", str(p)], env=env)
+        for p in ports
+    ]
+    try:
+        _wait_ready(procs, ports)
+        logger = get_logger()
+        if logger:
+            log_nowait(logger.info({"router_ready": {"port": port, "replicas": ports}}))
+        uvicorn.run(create_router_app(ports), host=host, port=port, log_config=log_config, access_log=True)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
@@ -4,14 +4,18 @@ class ResponseCode:
     SUCCESS = 200
     PARAM_FAIL = 400
     AUTH_FAIL = 403
+    TOO_LARGE = 413
     BUSINESS_FAIL = 500
+    TIMEOUT = 504
 
 
 class ResponseMessage:
     SUCCESS = "接口请求成功"
     PARAM_FAIL = "参数校验失败"
     AUTH_FAIL = "接口鉴权失败"
+    TOO_LARGE = "请求超出内存上限"
     BUSINESS_FAIL = "业务处理失败"
+    TIMEOUT = "请求已超时或已取消"
 
 
 def success(data=None, message=ResponseMessage.SUCCESS):
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+from utils.deadline import RequestCancelled, check_cancelled
+
+
+class SingleFlight:
+    """
+    合并并发中的相同计算：同一 key 在执行期间的后续调用不再重复计算，
+    而是等待首个调用的结果（成功或异常）后一并返回。
+    首个调用因自身超时/断连被取消时，其余等待者重新发起计算。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                fut = self._calls.get(key)
+                leader = fut is None
+                if leader:
+                    fut = Future()
+                    self._calls[key] = fut
+
+            if leader:
+                break
+            try:
+                return fut.result()
+            except RequestCancelled:
+                check_cancelled()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            # 先移除再通知，被唤醒的等待者重新发起时不会再拿到这次的结果
+            self._forget(key)
+            fut.set_exception(e)
+            raise
+        self._forget(key)
+        fut.set_result(result)
+        return result
+
+    def _forget(self, key: Hashable) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import hashlib
+import inspect
+import os
+import threading
+from typing import Any, Dict, Optional
+
+# 以词表与分词器配置文件内容区分分词器：bge-m3 与 bge-reranker-v2-m3 同为 XLM-R 词表，合并部署时只保留一份；
+# 配置文件（model_max_length、特殊 token、补齐方向）不同的模型即使词表相同也各用各的实例
+_VOCAB_FILES = ("tokenizer.json", "sentencepiece.bpe.model")
+_CONFIG_FILES = ("tokenizer_config.json", "special_tokens_map.json")
+
+_tokenizers: Dict[str, Any] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def _fingerprint(model_path: str) -> Optional[str]:
+    h = hashlib.sha1()
+    found = False
+    for name in _VOCAB_FILES + _CONFIG_FILES:
+        path = os.path.join(model_path, name)
+        if not os.path.isfile(path):
+            continue
+        found = found or name in _VOCAB_FILES
+        h.update(name.encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest() if found else None
+
+
+class LockedTokenizer:
+    """
+    对分词器的调用加锁。HF fast tokenizer 每次调用都会按本次参数（truncation / padding）修改底层 Rust 分词器，
+    推理线程池中多线程以不同参数并发调用（encode 截断、token_count / 分块不截断）会报 RuntimeError: Already borrowed；
+    合并部署时 embedding 与 rerank 共用同一实例，锁随实例共享。属性读写直接透传。
+    """
+
+    def __init__(self, tokenizer: Any):
+        object.__setattr__(self, "_tokenizer", tokenizer)
+        object.__setattr__(self, "_lock", threading.RLock())
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            return self._tokenizer(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._tokenizer, name)
+        if not inspect.ismethod(attr):
+            return attr
+        lock = self._lock
+
+        @functools.wraps(attr)
+        def locked(*args: Any, **kwargs: Any) -> Any:
+            with lock:
+                return attr(*args, **kwargs)
+
+        return locked
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._tokenizer, name, value)
+
+    def __len__(self) -> int:
+        return len(self._tokenizer)
+
+
+def shared_tokenizer(model_path: str, tokenizer: Any) -> LockedTokenizer:
+    """返回进程内与该模型词表一致的共享分词器（已加锁），首次出现的实例即为共享实例"""
+    if not isinstance(tokenizer, LockedTokenizer):
+        tokenizer = LockedTokenizer(tokenizer)
+    fp = _fingerprint(model_path)
+    if fp is None:
+        return tokenizer
+    with _tokenizers_lock:
+        return _tokenizers.setdefault(fp, tokenizer)
@@ -1,43 +1,157 @@
 # -*- coding: utf-8 -*-
 
+from typing import Optional, Tuple
+
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 
-from utils.request import RerankRequest
+from utils.admin import build_admin_router
+from utils.deadline import RequestCancelled
+from utils.memory import MemoryLimitExceeded
+from utils.executor import run_cancellable
+from utils.request import RerankRequest, RerankRecallRequest
 from utils.response import success, fail, ResponseCode, ResponseMessage
-from service.rerank_service import compute_rerank
-from config.loader import cfg
+from service.rerank_service import (
+    cascade_recall, compute_rerank, colbert_model_names, model_names, MODES, POOLINGS,
+)
 
 router = APIRouter()
+router.include_router(build_admin_router("rerank"))
+router.include_router(build_admin_router("colbert"))
+
+
+def _param_fail(loc: str, msg: str) -> JSONResponse:
+    return JSONResponse(
+        content=fail(
+            message=ResponseMessage.PARAM_FAIL,
+            code=ResponseCode.PARAM_FAIL,
+            data={"errors": [{"loc": ["body", loc], "msg": msg}]},
+        ),
+        status_code=ResponseCode.PARAM_FAIL,
+    )
+
+
+def _validate(body: RerankRequest) -> Tuple[Optional[str], Optional[JSONResponse]]:
+    """校验 /v1/rerank 与 /v1/rerank/recall 的公共参数，返回 (模型名, 错误响应)"""
+    if body.mode is not None and body.mode not in MODES:
+        return None, _param_fail("mode", f"mode 必须在以下范围内：{sorted(MODES)}")
+
+    if body.mode == "colbert" and body.passages:
+        return None, _param_fail("passages", "colbert 模式不支持 passages")
+
+    models = colbert_model_names() if body.mode == "colbert" else model_names()
+    model_name = body.model or next(iter(models), None)
+    if not model_name or model_name not in models:
+        return None, JSONResponse(
+            content=fail(
+                message=f"model 必须在以下范围内：{models}。",
+                code=ResponseCode.PARAM_FAIL,
+            ),
+            status_code=ResponseCode.PARAM_FAIL,
+        )
+
+    if not body.query or not body.documents:
+        return None, _param_fail("query/documents", "query/documents 不能为空")
+
+    if body.pooling is not None and body.pooling not in POOLINGS:
+        return None, _param_fail("pooling", f"pooling 必须在以下范围内：{sorted(POOLINGS)}")
+
+    if body.shortlist is not None and body.shortlist < 1:
+        return None, _param_fail("shortlist", "shortlist 必须大于 0")
+
+    if (body.query_embedding is None) != (body.document_embeddings is None):
+        return None, _param_fail("query_embedding/document_embeddings", "query_embedding 与 document_embeddings 需同时提供")
+
+    if body.document_embeddings is not None:
+        dim = len(body.query_embedding)
+        if len(body.document_embeddings) != len(body.documents):
+            return None, _param_fail("document_embeddings", "document_embeddings 数量必须与 documents 一致")
+        if not dim or any(len(vec) != dim for vec in body.document_embeddings):
+            return None, _param_fail("document_embeddings", "向量维度必须与 query_embedding 一致")
+
+    return model_name, None
 
 
 @router.post("/v1/rerank")
 async def rerank_api(request: Request, body: RerankRequest):
     try:
-        models_cfg = (cfg.get("rerank") or {}).get("models") or {}
-        model_name = body.model or next(iter(models_cfg.keys()), None)
-        if not model_name or model_name not in models_cfg:
-            return JSONResponse(
-                content=fail(
-                    message=f"model 必须在以下范围内：{list(models_cfg.keys())}。",
-                    code=ResponseCode.PARAM_FAIL,
-                ),
-                status_code=ResponseCode.PARAM_FAIL,
-            )
-
-        if not body.query or not body.documents:
-            return JSONResponse(
-                content=fail(
-                    message=ResponseMessage.PARAM_FAIL,
-                    code=ResponseCode.PARAM_FAIL,
-                    data={"errors": [{"loc": ["body", "query/documents"], "msg": "query/documents 不能为空"}]},
-                ),
-                status_code=ResponseCode.PARAM_FAIL,
-            )
-
-        data = compute_rerank(body.query, body.documents, model_name, body.top_n)
+        model_name, error = _validate(body)
+        if error is not None:
+            return error
+
+        data = await run_cancellable(
+            request,
+            compute_rerank,
+            body.query,
+            body.documents,
+            model_name,
+            body.top_n,
+            body.passages,
+            body.pooling,
+            body.mode,
+            body.cascade,
+            body.shortlist,
+            body.query_embedding,
+            body.document_embeddings,
+        )
+        return JSONResponse(content=success(data))
+
+    except MemoryLimitExceeded as e:
+        return JSONResponse(
+            content=fail(message=f"{ResponseMessage.TOO_LARGE}：{e}", code=ResponseCode.TOO_LARGE),
+            status_code=ResponseCode.TOO_LARGE,
+        )
+    except RequestCancelled as e:
+        return JSONResponse(
+            content=fail(message=f"{ResponseMessage.TIMEOUT}：{e.reason}", code=ResponseCode.TIMEOUT),
+            status_code=ResponseCode.TIMEOUT,
+        )
+    except Exception as e:
+        return JSONResponse(
+            content=fail(message=f"{e}", code=ResponseCode.BUSINESS_FAIL),
+            status_code=ResponseCode.BUSINESS_FAIL,
+        )
+
+
+@router.post("/v1/rerank/recall")
+async def rerank_recall_api(request: Request, body: RerankRecallRequest):
+    try:
+        model_name, error = _validate(body)
+        if error is not None:
+            return error
+
+        if not body.shortlists or any(k < 1 for k in body.shortlists):
+            return _param_fail("shortlists", "shortlists 不能为空且每项必须大于 0")
+
+        if body.top_n is not None and body.top_n < 1:
+            return _param_fail("top_n", "top_n 必须大于 0")
+
+        data = await run_cancellable(
+            request,
+            cascade_recall,
+            body.query,
+            body.documents,
+            model_name,
+            body.shortlists,
+            body.top_n,
+            body.passages,
+            body.pooling,
+            body.mode,
+            body.query_embedding,
+            body.document_embeddings,
+        )
         return JSONResponse(content=success(data))
 
+    except MemoryLimitExceeded as e:
+        return JSONResponse(
+            content=fail(message=f"{ResponseMessage.TOO_LARGE}：{e}", code=ResponseCode.TOO_LARGE),
+            status_code=ResponseCode.TOO_LARGE,
+        )
+    except RequestCancelled as e:
+        return JSONResponse(
+            content=fail(message=f"{ResponseMessage.TIMEOUT}：{e.reason}", code=ResponseCode.TIMEOUT),
+            status_code=ResponseCode.TIMEOUT,
+        )
     except Exception as e:
         return JSONResponse(
             content=fail(message=f"{e}", code=ResponseCode.BUSINESS_FAIL),
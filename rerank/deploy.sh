@@ -10,9 +10,11 @@ TAG="latest"                                              # 镜像标签
 CONTAINER="rerank"                                        # 容器名
 HOST_PORT=8089                                            # 宿主机端口
 APP_PORT=8089                                             # 容器端口
+GRPC_PORT=0                                               # gRPC 端口（宿主机与容器一致），0 表示不启用
 RESTART_POLICY="always"                                   # 重启策略
 USE_BUILDKIT=true                                         # BuildKit 加速
 MODEL_DIR="$(dirname "$(pwd)")/models/bge-reranker-v2-m3" # 权重模型目录
+COLBERT_MODEL_DIR="$(dirname "$(pwd)")/models/bge-m3"    # ColBERT 模式使用的 bge-m3 权重目录
 DEVICE="cpu"                                              # 仅允许: cpu | cuda
 GPU_IDS="0"                                               # 仅当 DEVICE=cuda 时生效，仅支持单卡运行
 ### =================================
@@ -50,7 +52,9 @@ echo "DEVICE: ${DEVICE}    GPU_IDS: ${GPU_IDS:-全部}"
 echo "镜像: ${FULL_IMAGE}"
 echo "容器: ${CONTAINER}"
 echo "端口映射: ${HOST_PORT}:${APP_PORT}"
+echo "gRPC 端口: ${GRPC_PORT}"
 echo "模型权重目录: ${MODEL_DIR}"
+echo "ColBERT 模型目录: ${COLBERT_MODEL_DIR}"
 echo "BuildKit: ${USE_BUILDKIT}"
 
 # ---------- BuildKit ----------
@@ -78,6 +82,7 @@ DOCKER_RUN_ARGS=(
   -e ENV="${ENV_NAME}"
   -e DEVICE="${DEVICE}"
   -v "${MODEL_DIR}:/models/bge-reranker-v2-m3"
+  -v "${COLBERT_MODEL_DIR}:/models/bge-m3"
   -p "${HOST_PORT}:${APP_PORT}"
   --restart "${RESTART_POLICY}"
 )
@@ -86,6 +91,10 @@ if [[ "${DEVICE}" == "cuda" ]]; then
   DOCKER_RUN_ARGS+=("${GPU_ARGS[@]}")
 fi
 
+if [[ "${GRPC_PORT}" != "0" ]]; then
+  DOCKER_RUN_ARGS+=(-e GRPC_PORT="${GRPC_PORT}" -p "${GRPC_PORT}:${GRPC_PORT}")
+fi
+
 docker run -d "${DOCKER_RUN_ARGS[@]}" "${FULL_IMAGE}"
 
 echo "部署完成，查看日志："
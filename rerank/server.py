@@ -1,99 +1,50 @@
 # -*- coding: utf-8 -*-
 
-from contextlib import asynccontextmanager
-from typing import Any, Dict, Set
+import time
 
-import uvicorn
-from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+_T0 = time.perf_counter()
 
-from config.loader import cfg
-from controller.rerank_controller import router
-from utils.exception import register_exception_handlers
-from utils.log import get_logger, build_log_config
-from utils.response import fail, ResponseMessage, ResponseCode
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
 
+import uvicorn  # noqa: E402
 
-def _uvicorn_options_from_cfg() -> Dict[str, Any]:
-    app_cfg = (cfg.get("app") or {})
-    host = app_cfg.get("host")
-    port = int(app_cfg.get("port"))
+from config.loader import cfg  # noqa: E402
+from controller.rerank_controller import router  # noqa: E402
+from utils.admin import build_process_admin_router  # noqa: E402
+from utils.app import create_app, uvicorn_options_from_cfg  # noqa: E402
+from utils.log import build_log_config  # noqa: E402
+from utils.replica import replica_count, run_router  # noqa: E402
+from utils.startup import profile_startup  # noqa: E402
 
-    return {
-        "host": host,
-        "port": port,
-        "workers": 1,
-    }
-
-
-def create_app() -> FastAPI:
-    @asynccontextmanager
-    async def lifespan(app: FastAPI):
-        app.state.logger = get_logger()
-        yield
-
-    app = FastAPI(lifespan=lifespan)
-
-    # CORS
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],
-        allow_credentials=False,
-        allow_methods=["*"],
-        allow_headers=["*"],
-        expose_headers=[],
-        max_age=600,
-    )
-
-    # 接口鉴权
-    _auth_cfg = (cfg.get("auth") or {})
-    _auth_enabled: bool = bool(_auth_cfg.get("enabled", False))
-    _auth_keys: Set[str] = {str(x).strip() for x in (_auth_cfg.get("keys") or []) if str(x).strip()}
-
-    @app.middleware("http")
-    async def auth_middleware(request: Request, call_next):
-        if request.method.upper() == "OPTIONS":
-            return await call_next(request)
-
-        if not _auth_enabled:
-            return await call_next(request)
-
-        if not _auth_keys:
-            return JSONResponse(
-                fail(message=ResponseMessage.AUTH_FAIL, code=ResponseCode.AUTH_FAIL),
-                status_code=ResponseCode.AUTH_FAIL,
-            )
-
-        auth_header = request.headers.get("authorization") or ""
-        if not auth_header.lower().startswith("bearer "):
-            return JSONResponse(
-                fail(message=ResponseMessage.AUTH_FAIL, code=ResponseCode.AUTH_FAIL),
-                status_code=ResponseCode.AUTH_FAIL,
-            )
-
-        token = auth_header.split(" ", 1)[1].strip()
-        if token not in _auth_keys:
-            return JSONResponse(
-                fail(message=ResponseMessage.AUTH_FAIL, code=ResponseCode.AUTH_FAIL),
-                status_code=ResponseCode.AUTH_FAIL,
-            )
-
-        return await call_next(request)
-
-    register_exception_handlers(app)
-    app.include_router(router)
-    return app
-
-
-app = create_app()
+app = create_app(router, build_process_admin_router(), grpc_services=("rerank",), preload=True)
+_APP_IMPORT_SECONDS = time.perf_counter() - _T0
 
 if __name__ == "__main__":
-    opts = _uvicorn_options_from_cfg()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile-startup", action="store_true", help="输出启动耗时分解（导入/加载/预热）后退出")
+    parser.add_argument("--host", help="监听地址，缺省取配置 app.host")
+    parser.add_argument("--port", type=int, help="监听端口，缺省取配置 app.port")
+    parser.add_argument("--replicas", type=int, help="路由模式：启动 N 个本地副本进程并按排队量分发，缺省取配置 router.replicas")
+    args = parser.parse_args()
+    if args.profile_startup:
+        print(json.dumps(profile_startup(_APP_IMPORT_SECONDS), ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    opts = uvicorn_options_from_cfg()
+    host = args.host or opts["host"]
+    port = args.port or opts["port"]
+    replicas = replica_count() if args.replicas is None else args.replicas
+    if replicas > 0:
+        run_router(os.path.abspath(__file__), host, port, replicas, build_log_config(cfg))
+        sys.exit(0)
+
     uvicorn.run(
         "server:app",
-        host=opts["host"],
-        port=opts["port"],
+        host=host,
+        port=port,
         workers=opts["workers"],
         log_config=build_log_config(cfg),
         access_log=True,
@@ -1,15 +1,30 @@
 # -*- coding: utf-8 -*-
 
 import os
+import hashlib
 import math
+import threading
 import uuid
-from functools import lru_cache
-from typing import Dict, Any, List, Tuple
+import weakref
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 
-from FlagEmbedding import FlagReranker
+import numpy as np
 
 from config.loader import cfg
-from utils.log import get_logger
+from utils.batcher import get_batcher
+from utils.cache import SizedLRU
+from utils.deadline import check_cancelled
+from utils.engine_cache import load_engine, shared_encoder
+from utils.log import get_logger, log_nowait
+from utils.memory import batch_admission
+from utils.model_pool import get_model_pool
+from utils.singleflight import SingleFlight
+from utils.tokenizer import shared_tokenizer
+
+# FlagEmbedding 会连带导入 torch/transformers，延迟到首次加载模型时再导入，缩短服务启动时间
+if TYPE_CHECKING:
+    from FlagEmbedding import BGEM3FlagModel, FlagReranker
 
 _RERANK = (cfg.get("rerank") or {})
 _MODELS: Dict[str, str] = _RERANK.get("models") or {}
@@ -23,68 +38,419 @@ if _DEVICE not in _ALLOWED:
 # 仅 cuda 支持 fp16
 _USE_FP16 = _DEVICE == "cuda"
 
+# 长文档段落级打分：按 token 窗口切分为段落，(query, 段落) 统一合批打分后按文档聚合
+_PASSAGES = (_RERANK.get("passages") or {})
+_WINDOW_TOKENS = int(_PASSAGES.get("window_tokens", 384))
+_OVERLAP_TOKENS = int(_PASSAGES.get("overlap_tokens", 64))
+_TOP_K = max(1, int(_PASSAGES.get("top_k", 3)))
+POOLINGS = {"max", "topk_mean"}
+DEFAULT_POOLING: str = str(_PASSAGES.get("pooling", "max")).strip().lower()
+if DEFAULT_POOLING not in POOLINGS:
+    raise ValueError(f"rerank.passages.pooling 仅支持 {POOLINGS}，当前：{DEFAULT_POOLING}")
+if not 0 <= _OVERLAP_TOKENS < _WINDOW_TOKENS:
+    raise ValueError("rerank.passages 需满足 0 <= overlap_tokens < window_tokens")
+
+# ColBERT 后期交互打分：文档多向量按内容哈希缓存，查询时只编码 query 并做 MaxSim
+_COLBERT = (_RERANK.get("colbert") or {})
+_COLBERT_MODELS: Dict[str, str] = _COLBERT.get("models") or {}
+_COLBERT_CACHE_BYTES = int(_COLBERT.get("cache_mb", 512)) * 1024 * 1024
+MODES = {"cross_encoder", "colbert"}
+
+# 两阶段级联：先用 bge-m3 稠密向量（或调用方提供的向量）做余弦预筛，只把前 shortlist 个候选交给精排
+# 预筛模型取 rerank.colbert.models 中的 bge-m3，文档稠密向量同样按内容哈希缓存
+_CASCADE = (_RERANK.get("cascade") or {})
+_CASCADE_MODEL: str = str(_CASCADE.get("model") or next(iter(_COLBERT_MODELS), ""))
+_CASCADE_SHORTLIST = max(1, int(_CASCADE.get("shortlist", 100)))
+_DENSE_CACHE_BYTES = int(_CASCADE.get("cache_mb", 256)) * 1024 * 1024
+
+# 编译模式：按序列长度分桶 trace / torch.compile，预热时逐桶编译（见 utils/compiled.py）
+_COMPILE_ENABLED = bool((cfg.get("compile") or {}).get("enabled", False))
+
+# 常驻模型不参与内存预算淘汰，其余模型在首次请求时按需加载
+_PINNED: List[str] = _RERANK.get("pinned") or []
+
+# 相同 (模型, query, documents) 的并发请求只计算一次
+_INFLIGHT = SingleFlight()
+
 
 def _sigmoid(x: float) -> float:
     return 1.0 / (1.0 + math.exp(-x))
 
 
-@lru_cache(maxsize=1)
-def _load_engines() -> Dict[str, FlagReranker]:
+def _build_engine(path: str) -> "FlagReranker":
+    from FlagEmbedding import FlagReranker
+
+    return FlagReranker(
+        model_name_or_path=path,
+        use_fp16=_USE_FP16,
+        local_files_only=True,
+        device=_DEVICE,
+    )
+
+
+def _create_engine(name: str, path: str) -> "FlagReranker":
     logger = get_logger()
-    engines: Dict[str, FlagReranker] = {}
-
-    if logger:
-        import asyncio
-        asyncio.create_task(
-            logger.info(
-                {
-                    "rerank_init": {
-                        "device": _DEVICE,
-                        "use_fp16": _USE_FP16,
-                        "models": list(_MODELS.keys()),
+    try:
+        engine = load_engine(("rerank", path, _DEVICE, _USE_FP16), path, lambda: _build_engine(path))
+        # 与进程内同词表的模型共用分词器（合并部署时与 embedding 共用）
+        engine.tokenizer = shared_tokenizer(path, engine.tokenizer)
+        if _COMPILE_ENABLED:
+            from utils.compiled import install_compiled
+
+            install_compiled(engine, "logits", _DEVICE, _USE_FP16, engine.tokenizer.pad_token_id)
+        if logger:
+            log_nowait(
+                logger.info(
+                    {
+                        "model_ready": {
+                            "name": name,
+                            "path": path,
+                            "device": _DEVICE,
+                            "fp16": _USE_FP16,
+                        }
                     }
-                }
+                )
             )
+        return engine
+    except Exception as e:
+        if logger:
+            log_nowait(
+                logger.error(
+                    {
+                        "model_init_failed": {
+                            "name": name,
+                            "path": path,
+                            "err": str(e),
+                        }
+                    }
+                )
+            )
+        raise
+
+
+def _warmup(engine: "FlagReranker") -> Optional[Dict[str, Any]]:
+    engine.compute_score([["warmup", "warmup"]])
+    if _COMPILE_ENABLED:
+        from utils.compiled import warmup_compiled
+
+        return warmup_compiled(engine)
+    return None
+
+
+get_model_pool().register("rerank", _MODELS, _create_engine, _warmup, pinned=_PINNED)
+
+_logger = get_logger()
+if _logger:
+    log_nowait(
+        _logger.info(
+            {
+                "rerank_init": {
+                    "device": _DEVICE,
+                    "use_fp16": _USE_FP16,
+                    "models": list(_MODELS.keys()),
+                    "pinned": _PINNED,
+                }
+            }
         )
+    )
 
-    for name, path in _MODELS.items():
-        try:
-            engines[name] = FlagReranker(
-                model_name_or_path=path,
-                use_fp16=_USE_FP16,
-                local_files_only=True,
-                device=_DEVICE,
-            )
-            if logger:
-                import asyncio
-                asyncio.create_task(
-                    logger.info(
-                        {
-                            "model_ready": {
-                                "name": name,
-                                "path": path,
-                                "device": _DEVICE,
-                                "fp16": _USE_FP16,
-                            }
+
+def _build_colbert_engine(path: str) -> "BGEM3FlagModel":
+    from FlagEmbedding import BGEM3FlagModel
+
+    return BGEM3FlagModel(
+        model_name_or_path=path,
+        use_fp16=_USE_FP16,
+        local_files_only=True,
+        device=_DEVICE,
+    )
+
+
+def _create_colbert_engine(name: str, path: str) -> "BGEM3FlagModel":
+    logger = get_logger()
+    try:
+        engine = load_engine(("colbert", path, _DEVICE, _USE_FP16), path, lambda: _build_colbert_engine(path))
+        engine.tokenizer = shared_tokenizer(path, engine.tokenizer)
+        # BGEM3FlagModel.model 为多向量头的封装，其内部编码器与 embedding 的 bge-m3 共用权重（仅合并部署时生效）
+        engine.model.model = shared_encoder(path, engine.model.model, _DEVICE, _USE_FP16)
+        if _COMPILE_ENABLED:
+            from utils.compiled import install_compiled
+
+            # BGEM3FlagModel.model 为多向量头的封装，编译其内部的 transformers 编码器
+            install_compiled(engine.model, "last_hidden_state", _DEVICE, _USE_FP16, engine.tokenizer.pad_token_id)
+        if logger:
+            log_nowait(
+                logger.info(
+                    {
+                        "model_ready": {
+                            "name": name,
+                            "path": path,
+                            "device": _DEVICE,
+                            "fp16": _USE_FP16,
+                            "mode": "colbert",
                         }
-                    )
+                    }
                 )
-        except Exception as e:
-            if logger:
-                import asyncio
-                asyncio.create_task(
-                    logger.error(
-                        {
-                            "model_init_failed": {
-                                "name": name,
-                                "path": path,
-                                "err": str(e),
-                            }
+            )
+        return engine
+    except Exception as e:
+        if logger:
+            log_nowait(
+                logger.error(
+                    {
+                        "model_init_failed": {
+                            "name": name,
+                            "path": path,
+                            "err": str(e),
+                            "mode": "colbert",
                         }
-                    )
+                    }
                 )
-            raise
-    return engines
+            )
+        raise
+
+
+def _warmup_colbert(engine: "BGEM3FlagModel") -> Optional[Dict[str, Any]]:
+    _encode_colbert(engine, ["warmup"])
+    if _COMPILE_ENABLED:
+        from utils.compiled import warmup_compiled
+
+        return warmup_compiled(engine.model)
+    return None
+
+
+get_model_pool().register("colbert", _COLBERT_MODELS, _create_colbert_engine, _warmup_colbert)
+
+# 每个 (向量类型, bge-m3 模型) 一份文档向量缓存，模型实例变化（热切换/重新加载）时整体失效；
+# 以弱引用比对实例而非 id()，旧实例被回收后其 id 可能被新实例复用
+_vector_caches: Dict[Tuple[str, str], Tuple["weakref.ref[Any]", SizedLRU]] = {}
+_vector_caches_lock = threading.Lock()
+
+
+def model_names() -> List[str]:
+    return get_model_pool().names("rerank")
+
+
+def colbert_model_names() -> List[str]:
+    return get_model_pool().names("colbert")
+
+
+def _engine(model_name: str) -> "FlagReranker":
+    return get_model_pool().get("rerank", model_name)
+
+
+def _compute_scores(rk: "FlagReranker", pairs: List[List[str]]) -> List[float]:
+    # compute_score 内部按长度排序后分批，混合长度的段落也能按长度分桶前向
+    scores = rk.compute_score(pairs)
+    if isinstance(scores, float):
+        scores = [scores]
+    return [float(s) for s in scores]
+
+
+def _score(model_name: str, rk: "FlagReranker", pairs: List[List[str]]) -> List[float]:
+    # 经微批调度器与其他请求合批打分
+    # 批次键带上引擎实例，热切换前后提交的任务不会混入同一批
+    # 启用 admission 时附带各对 token 数与激活内存估算，由调度器按内存上限切分批次
+    return get_batcher().run(
+        ("rerank", model_name, id(rk)), partial(_compute_scores, rk), pairs, **batch_admission(rk, pairs, _USE_FP16)
+    )
+
+
+def _encode_colbert(engine: "BGEM3FlagModel", texts: List[str]) -> List[np.ndarray]:
+    out = engine.encode(texts, return_dense=False, return_sparse=False, return_colbert_vecs=True)
+    return list(out["colbert_vecs"])
+
+
+def _encode_dense(engine: "BGEM3FlagModel", texts: List[str]) -> List[np.ndarray]:
+    out = engine.encode(texts, return_dense=True, return_sparse=False, return_colbert_vecs=False)
+    return list(out["dense_vecs"])
+
+
+def _vector_cache(kind: str, model_name: str, engine: "BGEM3FlagModel") -> SizedLRU:
+    with _vector_caches_lock:
+        cached = _vector_caches.get((kind, model_name))
+        if cached is None or cached[0]() is not engine:
+            capacity = _COLBERT_CACHE_BYTES if kind == "colbert" else _DENSE_CACHE_BYTES
+            cached = (weakref.ref(engine), SizedLRU(capacity))
+            _vector_caches[(kind, model_name)] = cached
+        return cached[1]
+
+
+def _colbert_vectors(model_name: str, engine: "BGEM3FlagModel", texts: List[str]) -> List[np.ndarray]:
+    return get_batcher().run(
+        ("colbert", model_name, id(engine)), partial(_encode_colbert, engine), texts,
+        **batch_admission(engine, texts, _USE_FP16),
+    )
+
+
+def _dense_vectors(model_name: str, engine: "BGEM3FlagModel", texts: List[str]) -> List[np.ndarray]:
+    return get_batcher().run(
+        ("dense", model_name, id(engine)), partial(_encode_dense, engine), texts,
+        **batch_admission(engine, texts, _USE_FP16),
+    )
+
+
+def _doc_vectors(
+    model_name: str,
+    engine: "BGEM3FlagModel",
+    documents: List[str],
+    kind: str = "colbert",
+) -> List[np.ndarray]:
+    # 命中缓存的文档不再编码，未命中的合批编码后以 float16 存入缓存
+    cache = _vector_cache(kind, model_name, engine)
+    keys = [hashlib.sha1(doc.encode("utf-8")).hexdigest() for doc in documents]
+    vectors: List[Optional[np.ndarray]] = [cache.get(k) for k in keys]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        encode = _colbert_vectors if kind == "colbert" else _dense_vectors
+        encoded = encode(model_name, engine, [documents[i] for i in missing])
+        for i, vec in zip(missing, encoded):
+            vec = np.asarray(vec, dtype=np.float16)
+            cache.put(keys[i], vec, vec.nbytes)
+            vectors[i] = vec
+    return vectors
+
+
+def _score_colbert(model_name: str, engine: "BGEM3FlagModel", query: str, documents: List[str]) -> List[float]:
+    query_vecs = np.asarray(_colbert_vectors(model_name, engine, [query])[0], dtype=np.float32)
+    doc_vecs = [
+        v if len(v) else np.zeros((1, query_vecs.shape[1]), dtype=np.float16)
+        for v in _doc_vectors(model_name, engine, documents)
+    ]
+    check_cancelled()
+
+    # 所有文档 token 向量拼成一个矩阵做一次矩阵乘，再按文档分段取每个 query token 的最大值（MaxSim）
+    token_scores = query_vecs @ np.concatenate(doc_vecs).astype(np.float32).T
+    starts = np.cumsum([0] + [len(v) for v in doc_vecs[:-1]])
+    max_sim = np.maximum.reduceat(token_scores, starts, axis=1)
+    return (max_sim.sum(axis=0) / query_vecs.shape[0]).tolist()
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _prefilter_scores(
+    query: str,
+    documents: List[str],
+    query_embedding: Optional[List[float]] = None,
+    document_embeddings: Optional[List[List[float]]] = None,
+) -> np.ndarray:
+    # 调用方提供向量时直接使用（先归一化），否则用本地 bge-m3 编码，文档稠密向量走缓存
+    if document_embeddings is not None:
+        query_vec = _normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+        doc_vecs = _normalize_rows(np.asarray(document_embeddings, dtype=np.float32))
+    else:
+        if not _CASCADE_MODEL:
+            raise RuntimeError("未配置级联预筛模型：rerank.cascade.model")
+        engine = get_model_pool().get("colbert", _CASCADE_MODEL)
+        query_vec = np.asarray(_dense_vectors(_CASCADE_MODEL, engine, [query])[0], dtype=np.float32)
+        doc_vecs = np.stack(_doc_vectors(_CASCADE_MODEL, engine, documents, kind="dense")).astype(np.float32)
+    check_cancelled()
+    return doc_vecs @ query_vec
+
+
+def _shortlist(scores: np.ndarray, k: int) -> List[int]:
+    # argpartition 取预筛分数前 k 个，按原始下标排列以保持去重与合批键稳定
+    if k >= len(scores):
+        return list(range(len(scores)))
+    return sorted(np.argpartition(-scores, k - 1)[:k].tolist())
+
+
+def _split_passages(tokenizer, doc: str) -> List[Tuple[int, int]]:
+    # 按 token 偏移切分，返回各段落在原文中的字符区间 [start, end)
+    offsets = tokenizer(doc, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= _WINDOW_TOKENS:
+        return [(0, len(doc))]
+
+    spans: List[Tuple[int, int]] = []
+    step = _WINDOW_TOKENS - _OVERLAP_TOKENS
+    for start in range(0, len(offsets), step):
+        end = min(start + _WINDOW_TOKENS, len(offsets))
+        spans.append((offsets[start][0], offsets[end - 1][1]))
+        if end == len(offsets):
+            break
+    return spans
+
+
+def _pool(scores: List[float], pooling: str) -> float:
+    if pooling == "topk_mean":
+        top = sorted(scores, reverse=True)[:_TOP_K]
+        return sum(top) / len(top)
+    return max(scores)
+
+
+def _score_passages(
+    model_name: str,
+    rk: "FlagReranker",
+    query: str,
+    documents: List[str],
+    pooling: str,
+) -> List[Tuple[float, Optional[Tuple[int, int]]]]:
+    spans = [_split_passages(rk.tokenizer, doc) for doc in documents]
+    check_cancelled()
+    pairs = [[query, doc[s:e]] for doc, doc_spans in zip(documents, spans) for s, e in doc_spans]
+    # 调度器按提交顺序把大任务切成 max_batch_size 的分段，FlagReranker 只在分段内按长度排序；
+    # 提交前整体按长度（与 FlagReranker 相同，按字符数）降序排列，使长度相近的段落落在同一批，再按原顺序还原分数
+    order = sorted(range(len(pairs)), key=lambda i: -len(pairs[i][1]))
+    sorted_scores = _score(model_name, rk, [pairs[i] for i in order])
+    scores: List[float] = [0.0] * len(pairs)
+    for i, score in zip(order, sorted_scores):
+        scores[i] = score
+
+    results: List[Tuple[float, Optional[Tuple[int, int]]]] = []
+    offset = 0
+    for doc_spans in spans:
+        n = len(doc_spans)
+        passage_scores = scores[offset:offset + n]
+        offset += n
+        best = max(range(n), key=passage_scores.__getitem__)
+        results.append((_pool(passage_scores, pooling), doc_spans[best]))
+    return results
+
+
+def _score_unique(
+    model_name: str,
+    engine: Any,
+    query: str,
+    documents: List[str],
+    mode: str,
+    passages: bool,
+    pooling: str,
+) -> List[Tuple[float, Optional[Tuple[int, int]]]]:
+    # 相同候选文档只打分一次，再按原始下标展开
+    unique: Dict[str, int] = {}
+    index = [unique.setdefault(doc, len(unique)) for doc in documents]
+    if mode == "colbert":
+        scored = [(s, None) for s in _score_colbert(model_name, engine, query, list(unique))]
+    elif passages:
+        scored = _score_passages(model_name, engine, query, list(unique), pooling)
+    else:
+        scored = [(s, None) for s in _score(model_name, engine, [[query, doc] for doc in unique])]
+    return [scored[i] for i in index]
+
+
+def _engine_for(mode: str, model_name: str) -> Tuple[Any, Any]:
+    if mode == "colbert":
+        # ColBERT 分数为 query token 的平均最大余弦相似度，已在 [-1, 1] 区间内，不再做 sigmoid
+        return get_model_pool().get("colbert", model_name), float
+    return _engine(model_name), _sigmoid
+
+
+def _rank(
+    query: str,
+    documents: List[str],
+    model_name: str,
+    engine: Any,
+    mode: str,
+    passages: bool,
+    pooling: str,
+) -> List[Tuple[float, Optional[Tuple[int, int]]]]:
+    return _INFLIGHT.do(
+        (mode, model_name, query, tuple(documents), passages, pooling),
+        lambda: _score_unique(model_name, engine, query, documents, mode, passages, pooling),
+    )
 
 
 def compute_rerank(
@@ -92,32 +458,87 @@ def compute_rerank(
     documents: List[str],
     model_name: str,
     top_n: int | None = None,
+    passages: bool = False,
+    pooling: str | None = None,
+    mode: str | None = None,
+    cascade: bool = False,
+    shortlist: int | None = None,
+    query_embedding: Optional[List[float]] = None,
+    document_embeddings: Optional[List[List[float]]] = None,
 ) -> Dict[str, Any]:
-    engines = _load_engines()
-    if model_name not in engines:
-        raise RuntimeError(f"模型未初始化：{model_name}")
-    rk = engines[model_name]
+    mode = mode or "cross_encoder"
+    pooling = pooling or DEFAULT_POOLING
+    engine, normalize = _engine_for(mode, model_name)
 
-    pairs = [[query, doc] for doc in documents]
-    scores = rk.compute_score(pairs)
-    if isinstance(scores, float):
-        scores = [scores]
+    # 级联模式下只有预筛入围的候选参与精排，未入围文档不出现在结果中
+    # 候选数不超过 shortlist 时跳过预筛，stages.prefilter 记为 0
+    candidates = list(range(len(documents)))
+    prefiltered = 0
+    if cascade:
+        k = shortlist or _CASCADE_SHORTLIST
+        if len(documents) > k:
+            prefilter = _prefilter_scores(query, documents, query_embedding, document_embeddings)
+            candidates = _shortlist(prefilter, k)
+            prefiltered = len(documents)
+    scored = _rank(query, [documents[i] for i in candidates], model_name, engine, mode, passages, pooling)
 
-    actual_top = len(documents) if top_n is None else max(0, min(top_n, len(documents)))
-    combined: List[Tuple[int, float]] = list(
-        zip(range(len(documents)), [float(s) for s in scores])
-    )
+    actual_top = len(candidates) if top_n is None else max(0, min(top_n, len(candidates)))
+    combined: List[Tuple[int, float]] = [(pos, score) for pos, (score, _) in enumerate(scored)]
     combined.sort(key=lambda x: x[1], reverse=True)
     selected = combined[:actual_top]
 
-    return {
+    results = []
+    for pos, score in selected:
+        idx = candidates[pos]
+        item = {
+            "index": idx,
+            "relevance_score": normalize(score),
+            "text": documents[idx],
+        }
+        span = scored[pos][1]
+        if passages and span is not None:
+            item["passage"] = {"start": span[0], "end": span[1]}
+        results.append(item)
+
+    data: Dict[str, Any] = {
         "id": str(uuid.uuid4()),
-        "results": [
-            {
-                "index": idx,
-                "relevance_score": _sigmoid(score),
-                "text": documents[idx],
-            }
-            for idx, score in selected
-        ],
+        "results": results,
     }
+    if cascade:
+        data["stages"] = {"prefilter": prefiltered, "rerank": len(candidates)}
+    return data
+
+
+def cascade_recall(
+    query: str,
+    documents: List[str],
+    model_name: str,
+    shortlists: List[int],
+    top_n: int | None = None,
+    passages: bool = False,
+    pooling: str | None = None,
+    mode: str | None = None,
+    query_embedding: Optional[List[float]] = None,
+    document_embeddings: Optional[List[List[float]]] = None,
+) -> Dict[str, Any]:
+    """
+    以全量精排为基准评估级联召回率，用于调整 shortlist：
+    精排分数与候选集合无关，全量精排一次后即可算出每个 shortlist 下的 recall@top_n。
+    """
+    mode = mode or "cross_encoder"
+    pooling = pooling or DEFAULT_POOLING
+    engine, _ = _engine_for(mode, model_name)
+
+    full = np.asarray([score for score, _ in _rank(query, documents, model_name, engine, mode, passages, pooling)])
+    prefilter = _prefilter_scores(query, documents, query_embedding, document_embeddings)
+
+    n = max(1, min(top_n or 10, len(documents)))
+    truth = set(np.argsort(-full, kind="stable")[:n].tolist())
+    prefilter_order = np.argsort(-prefilter, kind="stable")
+
+    recall = []
+    for k in shortlists:
+        candidates = prefilter_order[:k]
+        top = candidates[np.argsort(-full[candidates], kind="stable")[:n]]
+        recall.append({"shortlist": k, "recall": len(truth & set(top.tolist())) / n})
+    return {"documents": len(documents), "top_n": n, "recall": recall}
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Sequence, Set
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from config.loader import cfg
+from utils.exception import register_exception_handlers
+from utils.log import get_logger
+from utils.profiler import get_profiler
+from utils.response import fail, ResponseMessage, ResponseCode
+from utils.startup import preload_resident
+
+
+def uvicorn_options_from_cfg() -> Dict[str, Any]:
+    app_cfg = (cfg.get("app") or {})
+    host = app_cfg.get("host")
+    port = int(app_cfg.get("port"))
+
+    return {
+        "host": host,
+        "port": port,
+        "workers": 1,
+    }
+
+
+def grpc_port() -> int:
+    # 优先读取环境变量 GRPC_PORT，其次配置 grpc.port，0 表示不启用
+    return int(os.getenv("GRPC_PORT") or (cfg.get("grpc") or {}).get("port", 0) or 0)
+
+
+def create_app(*routers: APIRouter, grpc_services: Sequence[str] = (), preload: bool = False) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.logger = get_logger()
+        # 常驻模型在开始接收请求前加载并预热（路由进程不加载模型）；加载失败时服务启动失败
+        if preload:
+            await asyncio.get_running_loop().run_in_executor(None, preload_resident)
+        # gRPC 与 HTTP 同进程，共用模型池、推理线程池与微批调度器；grpcio 仅在启用时导入
+        grpc_server = None
+        if grpc_services and grpc_port() > 0:
+            from utils.grpc_server import start_grpc_server
+
+            grpc_server = start_grpc_server(grpc_services, grpc_port())
+        yield
+        if grpc_server is not None:
+            grpc_server.stop(grace=5)
+
+    app = FastAPI(lifespan=lifespan)
+
+    # CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=False,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[],
+        max_age=600,
+    )
+
+    # 剖析会话按完成的业务请求计数（管理接口与鉴权失败的请求不计），未开启会话时为空操作
+    @app.middleware("http")
+    async def profile_middleware(request: Request, call_next):
+        response = await call_next(request)
+        if not request.url.path.startswith("/admin/"):
+            get_profiler().request_done()
+        return response
+
+    # 接口鉴权
+    _auth_cfg = (cfg.get("auth") or {})
+    _auth_enabled: bool = bool(_auth_cfg.get("enabled", False))
+    _auth_keys: Set[str] = {str(x).strip() for x in (_auth_cfg.get("keys") or []) if str(x).strip()}
+    # 管理接口（/admin/）始终鉴权，且只接受 admin_keys，未配置时管理接口不可用
+    _admin_keys: Set[str] = {str(x).strip() for x in (_auth_cfg.get("admin_keys") or []) if str(x).strip()}
+
+    @app.middleware("http")
+    async def auth_middleware(request: Request, call_next):
+        if request.method.upper() == "OPTIONS":
+            return await call_next(request)
+
+        if request.url.path.startswith("/admin/"):
+            auth_header = request.headers.get("authorization") or ""
+            token = auth_header.split(" ", 1)[1].strip() if auth_header.lower().startswith("bearer ") else ""
+            if not token or token not in _admin_keys:
+                return JSONResponse(
+                    fail(message=ResponseMessage.AUTH_FAIL, code=ResponseCode.AUTH_FAIL),
+                    status_code=ResponseCode.AUTH_FAIL,
+                )
+            return await call_next(request)
+
+        if not _auth_enabled:
+            return await call_next(request)
+
+        if not _auth_keys:
+            return JSONResponse(
+                fail(message=ResponseMessage.AUTH_FAIL, code=ResponseCode.AUTH_FAIL),
+                status_code=ResponseCode.AUTH_FAIL,
+            )
+
+        auth_header = request.headers.get("authorization") or ""
+        if not auth_header.lower().startswith("bearer "):
+            return JSONResponse(
+                fail(message=ResponseMessage.AUTH_FAIL, code=ResponseCode.AUTH_FAIL),
+                status_code=ResponseCode.AUTH_FAIL,
+            )
+
+        token = auth_header.split(" ", 1)[1].strip()
+        if token not in _auth_keys:
+            return JSONResponse(
+                fail(message=ResponseMessage.AUTH_FAIL, code=ResponseCode.AUTH_FAIL),
+                status_code=ResponseCode.AUTH_FAIL,
+            )
+
+        return await call_next(request)
+
+    register_exception_handlers(app)
+    for router in routers:
+        app.include_router(router)
+    return app
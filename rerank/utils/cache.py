@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class SizedLRU:
+    """按字节容量淘汰的线程安全 LRU 缓存，单条超过容量的值不缓存"""
+
+    def __init__(self, capacity_bytes: int):
+        self._capacity = max(0, int(capacity_bytes))
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        if nbytes > self._capacity:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._items[key] = (value, nbytes)
+            self._size += nbytes
+            while self._size > self._capacity:
+                _, (_, size) = self._items.popitem(last=False)
+                self._size -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._items), "bytes": self._size, "capacity": self._capacity}
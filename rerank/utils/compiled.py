@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import statistics
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+import torch.nn.functional as F
+from transformers.modeling_outputs import BaseModelOutput, SequenceClassifierOutput
+
+from config.loader import cfg
+from utils.log import get_logger, log_nowait
+
+# 编译模式：按固定序列长度分桶，输入补齐到最近的桶，每个桶复用一份编译图；超过最大桶的输入走原始 eager 前向
+_COMPILE = (cfg.get("compile") or {})
+BACKENDS = {"trace", "torch_compile"}
+_BACKEND: str = str(_COMPILE.get("backend", "trace")).strip().lower()
+if _BACKEND not in BACKENDS:
+    raise ValueError(f"compile.backend 仅支持 {BACKENDS}，当前：{_BACKEND}")
+_BUCKETS: List[int] = sorted({int(b) for b in (_COMPILE.get("buckets") or [32, 64, 128, 256, 512])})
+_WARMUP_BATCH = max(1, int(_COMPILE.get("warmup_batch", 8)))
+_WARMUP_REPEATS = max(1, int(_COMPILE.get("warmup_repeats", 5)))
+
+_OUTPUTS = {"last_hidden_state": BaseModelOutput, "logits": SequenceClassifierOutput}
+
+
+class _Forward(torch.nn.Module):
+    # 只保留 input_ids / attention_mask 两个张量输入与单个张量输出，便于 trace / compile
+    def __init__(self, model: torch.nn.Module, output_key: str):
+        super().__init__()
+        self.model = model
+        self.output_key = output_key
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)[self.output_key]
+
+
+class BucketedModel(torch.nn.Module):
+    """
+    替换 FlagEmbedding 引擎内部的 transformers 模型：调用方式与返回结构（.last_hidden_state / .logits）保持不变，
+    原模型作为子模块保留，FlagEmbedding 每次 encode 前的 half()/to()/eval() 仍然生效（编译前已完成转换，为空操作）。
+    """
+
+    def __init__(self, model: torch.nn.Module, output_key: str, pad_token_id: int):
+        super().__init__()
+        self.model = model
+        self.config = model.config
+        self._output_key = output_key
+        self._pad_token_id = pad_token_id
+        self._forward = _Forward(model, output_key).eval()
+        self._graphs: Dict[int, Optional[Callable[..., torch.Tensor]]] = {}
+        self._compiled: Optional[Callable[..., torch.Tensor]] = None
+        self._lock = threading.Lock()
+
+    def forward(self, input_ids=None, attention_mask=None, token_type_ids=None, return_dict=True, **kwargs):
+        length = input_ids.shape[1] if input_ids is not None else 0
+        index = bisect.bisect_left(_BUCKETS, length)
+        plain = kwargs or attention_mask is None or (token_type_ids is not None and bool(token_type_ids.any()))
+        graph = None if plain or index == len(_BUCKETS) else self._graph(_BUCKETS[index])
+        if graph is None:
+            return self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids,
+                return_dict=return_dict, **kwargs,
+            )
+
+        bucket = _BUCKETS[index]
+        padded_ids, padded_mask = input_ids, attention_mask
+        if bucket > length:
+            padded_ids = F.pad(input_ids, (0, bucket - length), value=self._pad_token_id)
+            padded_mask = F.pad(attention_mask, (0, bucket - length), value=0)
+        try:
+            out = self._call(graph, padded_ids, padded_mask)
+        except Exception as e:
+            # torch.compile 在首次调用时才真正编译，失败后该桶退回 eager
+            self._disable(bucket, e)
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=return_dict)
+        if self._output_key == "last_hidden_state":
+            out = out[:, :length]
+        return _OUTPUTS[self._output_key](**{self._output_key: out})
+
+    @staticmethod
+    def _call(graph: Callable[..., torch.Tensor], input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        if _BACKEND == "torch_compile" and input_ids.shape[0] > 1:
+            # 批大小标记为动态，每个桶只生成一份图（批大小 1 会被单独特化）
+            torch._dynamo.mark_dynamic(input_ids, 0)
+            torch._dynamo.mark_dynamic(attention_mask, 0)
+        return graph(input_ids, attention_mask)
+
+    def _example(self, batch: int, bucket: int):
+        device = next(self.model.parameters()).device
+        vocab = int(getattr(self.config, "vocab_size", 1000))
+        input_ids = torch.randint(low=min(5, vocab - 1), high=vocab, size=(batch, bucket), device=device)
+        return input_ids, torch.ones_like(input_ids)
+
+    def _graph(self, bucket: int) -> Optional[Callable[..., torch.Tensor]]:
+        if bucket in self._graphs:
+            return self._graphs[bucket]
+        with self._lock:
+            if bucket not in self._graphs:
+                self._graphs[bucket] = self._build(bucket)
+            return self._graphs[bucket]
+
+    def _disable(self, bucket: int, e: Exception) -> None:
+        with self._lock:
+            self._graphs[bucket] = None
+        logger = get_logger()
+        if logger:
+            log_nowait(logger.error({"compile_failed": {"backend": _BACKEND, "bucket": bucket, "err": str(e)}}))
+
+    def _build(self, bucket: int) -> Optional[Callable[..., torch.Tensor]]:
+        try:
+            with torch.no_grad():
+                if _BACKEND == "torch_compile":
+                    if self._compiled is None:
+                        self._compiled = torch.compile(self._forward, dynamic=False)
+                    return self._compiled
+                # 用不同批大小校验 trace 结果，避免把批大小固化进图
+                example = self._example(2, bucket)
+                check = self._example(1, bucket)
+                return torch.jit.trace(self._forward, example, check_inputs=[check, example])
+        except Exception as e:
+            self._disable(bucket, e)
+            return None
+
+    def warmup(self) -> List[Dict[str, Any]]:
+        """逐桶编译，并以 warmup_batch 条输入对比 eager 与编译后的单次前向耗时"""
+        report = []
+        with torch.no_grad():
+            for bucket in _BUCKETS:
+                input_ids, attention_mask = self._example(_WARMUP_BATCH, bucket)
+                start = time.perf_counter()
+                graph = self._graph(bucket)
+                try:
+                    if graph is None:
+                        raise RuntimeError("编译失败，该桶使用 eager 前向")
+                    compiled_out = self._call(graph, input_ids, attention_mask)
+                    if _BACKEND == "torch_compile":
+                        self._call(graph, input_ids[:1], attention_mask[:1])
+                except Exception as e:
+                    if graph is not None:
+                        self._disable(bucket, e)
+                    report.append({"bucket": bucket, "compiled": False, "err": str(e)})
+                    continue
+                compile_seconds = time.perf_counter() - start
+
+                eager_out = self._forward(input_ids, attention_mask)
+                eager_ms = _median_ms(lambda: self._forward(input_ids, attention_mask))
+                compiled_ms = _median_ms(lambda: self._call(graph, input_ids, attention_mask))
+                report.append({
+                    "bucket": bucket,
+                    "compiled": True,
+                    "compile_seconds": round(compile_seconds, 3),
+                    "eager_ms": round(eager_ms, 2),
+                    "compiled_ms": round(compiled_ms, 2),
+                    "speedup": round(eager_ms / compiled_ms, 2) if compiled_ms > 0 else None,
+                    "max_abs_diff": float((eager_out.float() - compiled_out.float()).abs().max()),
+                })
+        return report
+
+
+def _median_ms(fn: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(_WARMUP_REPEATS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(timings)
+
+
+def install_compiled(owner: Any, output_key: str, device: str, use_fp16: bool, pad_token_id: int) -> BucketedModel:
+    """把 owner.model 替换为分桶编译版本；精度与设备在编译前转换好，编译图与原模型共享权重"""
+    model = owner.model
+    if use_fp16:
+        model.half()
+    model.to(device)
+    model.eval()
+    bucketed = BucketedModel(model, output_key, pad_token_id)
+    owner.model = bucketed
+    return bucketed
+
+
+def warmup_compiled(owner: Any) -> Optional[Dict[str, Any]]:
+    model = getattr(owner, "model", None)
+    if not isinstance(model, BucketedModel):
+        return None
+    return {"compile": {"backend": _BACKEND, "buckets": model.warmup()}}
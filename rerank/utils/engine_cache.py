@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Tuple
+
+from config.loader import cfg
+from utils.log import get_logger, log_nowait
+
+# 参与缓存指纹的模型目录文件：权重、模型配置与分词器
+_TRACKED_SUFFIXES = (".safetensors", ".bin", ".pt", ".json", ".model")
+
+
+def _cache_dir() -> str:
+    return str((cfg.get("startup") or {}).get("engine_cache_dir") or "").strip()
+
+
+def _fingerprint(key: Tuple[Any, ...], path: str) -> str:
+    import torch
+
+    h = hashlib.sha1(repr(key).encode("utf-8"))
+    h.update(torch.__version__.encode("utf-8"))
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(_TRACKED_SUFFIXES):
+                st = os.stat(os.path.join(path, name))
+                h.update(f"{name}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _log(level: str, data: Any) -> None:
+    logger = get_logger()
+    if logger:
+        log_nowait(getattr(logger, level)(data))
+
+
+def load_engine(key: Tuple[Any, ...], path: str, build: Callable[[], Any]) -> Any:
+    """
+    预构建引擎缓存：配置 startup.engine_cache_dir 后，首次构建的引擎（模型 + 分词器）序列化到缓存目录，
+    之后启动通过 torch.load(mmap=True) 以内存映射方式加载，权重按需分页读入，无需重新初始化模型。
+    缓存指纹包含 key、torch 版本与模型目录文件的大小和修改时间，任一变化都会重新构建。
+    """
+    cache_dir = _cache_dir()
+    if not cache_dir:
+        return build()
+
+    import torch
+
+    cache_file = os.path.join(cache_dir, f"{key[0]}-{_fingerprint(key, path)}.pt")
+    if os.path.isfile(cache_file):
+        start = time.perf_counter()
+        try:
+            # 缓存文件由本服务生成，需反序列化完整的引擎对象
+            engine = torch.load(cache_file, mmap=True, weights_only=False)
+            _log("info", {"engine_cache_hit": {
+                "path": path, "cache": cache_file, "seconds": round(time.perf_counter() - start, 3),
+            }})
+            return engine
+        except Exception as e:
+            _log("warning", {"engine_cache_invalid": {"path": path, "cache": cache_file, "err": str(e)}})
+
+    engine = build()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        torch.save(engine, tmp_file)
+        os.replace(tmp_file, cache_file)
+        _log("info", {"engine_cache_saved": {"path": path, "cache": cache_file}})
+    except Exception as e:
+        _log("warning", {"engine_cache_save_failed": {"path": path, "cache": cache_file, "err": str(e)}})
+    return engine
+
+
+_encoders: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+_encoders_lock = threading.Lock()
+
+
+def shared_encoder(path: str, model: Any, device: str, use_fp16: bool) -> Any:
+    """
+    返回进程内同一模型目录（文件未变化）、同设备与精度下已加载的 transformers 编码器，首次出现的实例即为共享实例。
+    合并部署时 embedding（FlagModel）与 rerank 的 colbert / 级联预筛（BGEM3FlagModel）指向同一 bge-m3，只保留一份权重；
+    新加载的副本由调用方替换后释放（加载期间内存仍会短暂翻倍）。以弱引用登记，引用它的引擎都卸载后随之释放。
+    """
+    key = _fingerprint(("encoder", os.path.realpath(path), device, use_fp16, type(model).__name__), path)
+    with _encoders_lock:
+        existing = _encoders.get(key)
+        if existing is None:
+            _encoders[key] = model
+            return model
+    _log("info", {"encoder_shared": {"path": path, "device": device, "fp16": use_fp16}})
+    return existing
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from fastapi import Request
+
+from config.loader import cfg
+from utils.deadline import RequestCancelled, bind_token, request_token
+
+_DEFAULT_MAX_WORKERS = 8
+# 等待推理结果期间检查客户端是否断开的间隔（秒）
+_POLL_INTERVAL = 0.1
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """进程内共享的推理线程池（合并部署时 embedding 与 rerank 共用）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            executor_cfg = (cfg.get("executor") or {})
+            _executor = ThreadPoolExecutor(
+                max_workers=int(executor_cfg.get("max_workers", _DEFAULT_MAX_WORKERS)),
+                thread_name_prefix="inference",
+            )
+        return _executor
+
+
+async def run_in_executor(fn: Callable[..., Any], *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    # 复制上下文，使取消令牌等 contextvars 在线程池内可见
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), ctx.run, partial(fn, *args))
+
+
+async def run_cancellable(request: Request, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    带截止时间与断连检测的 run_in_executor：超时或客户端断开时立即取消令牌并抛出 RequestCancelled，
+    排队中的推理在进入模型前丢弃，执行中的分批任务在批次之间停止。
+    """
+    token = request_token(request)
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    ctx.run(bind_token, token)
+    fut = loop.run_in_executor(get_executor(), ctx.run, partial(fn, *args))
+
+    while True:
+        done, _ = await asyncio.wait({fut}, timeout=_POLL_INTERVAL)
+        if done:
+            return fut.result()
+        if await request.is_disconnected():
+            token.cancel("client_disconnected")
+        if token.expired():
+            # 后台任务会在下一个检查点以 RequestCancelled 结束，这里只需取走其结果
+            fut.add_done_callback(lambda f: f.exception())
+            raise RequestCancelled(token.reason or "cancelled")
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Set
+
+import grpc
+import numpy as np
+
+from config.loader import cfg
+from utils.deadline import CancelToken, RequestCancelled, bind_token, new_token
+from utils.executor import get_executor
+from utils.log import get_logger, log_nowait
+from utils.memory import MemoryLimitExceeded
+from utils.profiler import get_profiler
+from utils.proto import inference_pb2 as pb
+from utils.proto import inference_pb2_grpc as pb_grpc
+from utils.response import ResponseMessage
+
+_GRPC = (cfg.get("grpc") or {})
+_MAX_WORKERS = int(_GRPC.get("max_workers", 16))
+_STREAM_WINDOW = max(1, int(_GRPC.get("stream_window", 8)))
+_MAX_MESSAGE_BYTES = int(_GRPC.get("max_message_mb", 64)) * 1024 * 1024
+_DTYPES = {pb.FLOAT32: "<f4", pb.FLOAT16: "<f2"}
+
+
+class _InvalidArgument(ValueError):
+    pass
+
+
+def _pack(matrix: np.ndarray, dtype: int) -> pb.Matrix:
+    arr = np.ascontiguousarray(matrix, dtype=_DTYPES[dtype])
+    return pb.Matrix(rows=arr.shape[0], dim=arr.shape[1], dtype=dtype, data=arr.tobytes())
+
+
+def _unpack(matrix: pb.Matrix, field: str) -> Optional[np.ndarray]:
+    if not matrix.rows:
+        return None
+    if matrix.dtype not in _DTYPES:
+        raise _InvalidArgument(f"{field}.dtype 不支持：{matrix.dtype}")
+    arr = np.frombuffer(matrix.data, dtype=_DTYPES[matrix.dtype])
+    if arr.size != matrix.rows * matrix.dim:
+        raise _InvalidArgument(f"{field}.data 长度与 rows × dim 不符")
+    return arr.reshape(matrix.rows, matrix.dim).astype(np.float32)
+
+
+def _rpc_token(context: grpc.ServicerContext, stream: bool = False) -> CancelToken:
+    # 截止时间取 gRPC deadline，未设置时一元调用取配置 app.request_timeout_ms；调用结束（含客户端取消）后令牌失效。
+    # 长连接的流不套用单请求超时，只随 gRPC deadline 或连接断开失效，超时由各条消息的子令牌单独计算
+    remaining = context.time_remaining()
+    if remaining is not None:
+        token = new_token(remaining * 1000.0)
+    else:
+        token = CancelToken() if stream else new_token()
+    context.add_callback(lambda: token.cancel("client_disconnected"))
+    return token
+
+
+def _invoke(token: CancelToken, fn: Callable[..., Any], *args: Any) -> Any:
+    # 在独立上下文中绑定令牌，避免残留在复用的 gRPC 工作线程上
+    ctx = contextvars.copy_context()
+    ctx.run(bind_token, token)
+    try:
+        return ctx.run(fn, *args)
+    finally:
+        # 流式调用中每条请求消息计为一个请求
+        get_profiler().request_done()
+
+
+def _abort(context: grpc.ServicerContext, e: Exception) -> None:
+    if isinstance(e, _InvalidArgument):
+        context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"{ResponseMessage.PARAM_FAIL}：{e}")
+    if isinstance(e, MemoryLimitExceeded):
+        context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"{ResponseMessage.TOO_LARGE}：{e}")
+    if isinstance(e, RequestCancelled):
+        code = grpc.StatusCode.DEADLINE_EXCEEDED if e.reason == "deadline_exceeded" else grpc.StatusCode.CANCELLED
+        context.abort(code, f"{ResponseMessage.TIMEOUT}：{e.reason}")
+    context.abort(grpc.StatusCode.INTERNAL, f"{e}")
+
+
+def _pick_model(requested: str, models: Sequence[str]) -> str:
+    model_name = requested or next(iter(models), None)
+    if not model_name or model_name not in models:
+        raise _InvalidArgument(f"model 必须在以下范围内：{list(models)}")
+    return model_name
+
+
+class _EmbeddingServicer(pb_grpc.EmbeddingServicer):
+    def __init__(self):
+        from service.embedding_service import POOLINGS, embed_dense, model_names, token_count
+
+        self._poolings = POOLINGS
+        self._embed_dense = embed_dense
+        self._model_names = model_names
+        self._token_count = token_count
+
+    def _embed(self, request: pb.EmbedRequest) -> pb.EmbedResponse:
+        model_name = _pick_model(request.model, self._model_names())
+        if not request.input:
+            raise _InvalidArgument("input 不能为空")
+        if request.pooling and request.pooling not in self._poolings:
+            raise _InvalidArgument(f"pooling 必须在以下范围内：{sorted(self._poolings)}")
+        if request.dtype not in _DTYPES:
+            raise _InvalidArgument(f"dtype 不支持：{request.dtype}")
+
+        texts = list(request.input)
+        dense = self._embed_dense(texts, model_name, request.chunking, request.pooling or None)
+        return pb.EmbedResponse(
+            embeddings=_pack(dense, request.dtype),
+            model=model_name,
+            prompt_tokens=sum(self._token_count(texts, model_name)),
+            request_id=request.request_id,
+        )
+
+    def Embed(self, request, context):
+        token = _rpc_token(context)
+        try:
+            return _invoke(token, self._embed, request)
+        except Exception as e:
+            _abort(context, e)
+
+    def EmbedStream(self, request_iterator, context) -> Iterator[pb.EmbedResponse]:
+        # 读取线程持续接收请求并提交到推理线程池（与 HTTP 共用，跨请求合批），
+        # 在途请求数以 stream_window 为上限形成背压，结果按请求顺序返回
+        token = _rpc_token(context, stream=True)
+        pending: "queue.Queue[Optional[Future]]" = queue.Queue(maxsize=_STREAM_WINDOW)
+
+        def _put(item: Optional[Future]) -> None:
+            while not token.expired():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def _read() -> None:
+            try:
+                for request in request_iterator:
+                    # 每条消息单独计算 app.request_timeout_ms，流失效时一并失效
+                    _put(get_executor().submit(_invoke, new_token(parent=token), self._embed, request))
+            except Exception:
+                # 客户端取消或连接中断，令牌已由 add_callback 失效
+                pass
+            finally:
+                _put(None)
+
+        threading.Thread(target=_read, name="grpc-embed-stream", daemon=True).start()
+        while True:
+            try:
+                fut = pending.get(timeout=0.1)
+            except queue.Empty:
+                if token.expired():
+                    _abort(context, RequestCancelled(token.reason or "cancelled"))
+                continue
+            if fut is None:
+                return
+            try:
+                yield fut.result()
+            except Exception as e:
+                token.cancel("stream_failed")
+                _abort(context, e)
+
+
+class _RerankServicer(pb_grpc.RerankServicer):
+    def __init__(self):
+        from service.rerank_service import MODES, POOLINGS, colbert_model_names, compute_rerank, model_names
+
+        self._modes = MODES
+        self._poolings = POOLINGS
+        self._colbert_model_names = colbert_model_names
+        self._compute_rerank = compute_rerank
+        self._model_names = model_names
+
+    def _rerank(self, request: pb.RerankRequest) -> pb.RerankResponse:
+        mode = request.mode or None
+        if mode is not None and mode not in self._modes:
+            raise _InvalidArgument(f"mode 必须在以下范围内：{sorted(self._modes)}")
+        if mode == "colbert" and request.passages:
+            raise _InvalidArgument("colbert 模式不支持 passages")
+        model_name = _pick_model(
+            request.model, self._colbert_model_names() if mode == "colbert" else self._model_names()
+        )
+        if not request.query or not request.documents:
+            raise _InvalidArgument("query/documents 不能为空")
+        if request.pooling and request.pooling not in self._poolings:
+            raise _InvalidArgument(f"pooling 必须在以下范围内：{sorted(self._poolings)}")
+        if request.HasField("shortlist") and request.shortlist < 1:
+            raise _InvalidArgument("shortlist 必须大于 0")
+
+        query_embedding = _unpack(request.query_embedding, "query_embedding")
+        document_embeddings = _unpack(request.document_embeddings, "document_embeddings")
+        if (query_embedding is None) != (document_embeddings is None):
+            raise _InvalidArgument("query_embedding 与 document_embeddings 需同时提供")
+        if document_embeddings is not None:
+            if query_embedding.shape[0] != 1:
+                raise _InvalidArgument("query_embedding 必须为 1 × dim")
+            if document_embeddings.shape != (len(request.documents), query_embedding.shape[1]):
+                raise _InvalidArgument("document_embeddings 必须为 len(documents) × dim")
+            query_embedding = query_embedding[0]
+
+        data = self._compute_rerank(
+            request.query,
+            list(request.documents),
+            model_name,
+            request.top_n if request.HasField("top_n") else None,
+            request.passages,
+            request.pooling or None,
+            mode,
+            request.cascade,
+            request.shortlist if request.HasField("shortlist") else None,
+            query_embedding,
+            document_embeddings,
+        )
+
+        results = []
+        for item in data["results"]:
+            result: Dict[str, Any] = {"index": item["index"], "relevance_score": item["relevance_score"]}
+            if "passage" in item:
+                result["passage"] = pb.Span(**item["passage"])
+            results.append(pb.RerankResult(**result))
+        response = pb.RerankResponse(id=data["id"], results=results)
+        if "stages" in data:
+            response.stages.CopyFrom(pb.RerankStages(**data["stages"]))
+        return response
+
+    def Rerank(self, request, context):
+        token = _rpc_token(context)
+        try:
+            return _invoke(token, self._rerank, request)
+        except Exception as e:
+            _abort(context, e)
+
+
+class _AuthInterceptor(grpc.ServerInterceptor):
+    """与 HTTP 接口共用 auth.keys，metadata 需携带 authorization: Bearer <key>"""
+
+    def __init__(self):
+        auth_cfg = (cfg.get("auth") or {})
+        self._enabled = bool(auth_cfg.get("enabled", False))
+        self._keys: Set[str] = {str(x).strip() for x in (auth_cfg.get("keys") or []) if str(x).strip()}
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or not self._enabled:
+            return handler
+        metadata = dict(handler_call_details.invocation_metadata or ())
+        auth_header = str(metadata.get("authorization") or "")
+        token = auth_header.split(" ", 1)[1].strip() if auth_header.lower().startswith("bearer ") else ""
+        if token and token in self._keys:
+            return handler
+        return _deny(handler)
+
+
+def _deny(handler: grpc.RpcMethodHandler) -> grpc.RpcMethodHandler:
+    def abort(request, context):
+        context.abort(grpc.StatusCode.UNAUTHENTICATED, ResponseMessage.AUTH_FAIL)
+
+    if handler.request_streaming and handler.response_streaming:
+        return grpc.stream_stream_rpc_method_handler(abort)
+    if handler.request_streaming:
+        return grpc.stream_unary_rpc_method_handler(abort)
+    if handler.response_streaming:
+        return grpc.unary_stream_rpc_method_handler(abort)
+    return grpc.unary_unary_rpc_method_handler(abort)
+
+
+def start_grpc_server(services: Sequence[str], port: int) -> grpc.Server:
+    """在当前进程启动 gRPC 服务（独立线程池），services 取 embedding / rerank"""
+    # 每个流式调用在整个流期间占用一个工作线程，max_workers 即可同时保持的流数上限
+    server = grpc.server(
+        ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="grpc"),
+        interceptors=[_AuthInterceptor()],
+        options=[
+            ("grpc.max_receive_message_length", _MAX_MESSAGE_BYTES),
+            ("grpc.max_send_message_length", _MAX_MESSAGE_BYTES),
+        ],
+    )
+    if "embedding" in services:
+        pb_grpc.add_EmbeddingServicer_to_server(_EmbeddingServicer(), server)
+    if "rerank" in services:
+        pb_grpc.add_RerankServicer_to_server(_RerankServicer(), server)
+
+    host = (cfg.get("app") or {}).get("host") or "0.0.0.0"
+    server.add_insecure_port(f"{host}:{port}")
+    server.start()
+
+    logger = get_logger()
+    if logger:
+        log_nowait(logger.info({"grpc_ready": {"host": host, "port": port, "services": list(services)}}))
+    return server
@@ -2,6 +2,7 @@
 
 import os
 
+import asyncio
 import json
 import logging
 from typing import Any, Optional, Dict
@@ -48,6 +49,14 @@ def get_logger() -> AsyncLogger:
     return _logger
 
 
+def log_nowait(coro) -> None:
+    """事件循环内以任务方式调度日志协程；线程池等无事件循环的上下文中直接同步执行"""
+    try:
+        asyncio.get_running_loop().create_task(coro)
+    except RuntimeError:
+        asyncio.run(coro)
+
+
 def build_log_config(cfg: Optional[Dict] = None) -> Dict:
     level = str(_get(cfg, "level", _DEFAULT_LEVEL)).upper()
     fmt = _get(cfg, "format", _DEFAULT_FMT)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config.loader import cfg
+
+_PROFILING = (cfg.get("profiling") or {})
+_DEFAULT_SECONDS = float(_PROFILING.get("default_seconds", 10))
+_MAX_SECONDS = float(_PROFILING.get("max_seconds", 60))
+_INTERVAL_MS = float(_PROFILING.get("interval_ms", 10))
+_TOP_OPS = int(_PROFILING.get("top_ops", 30))
+
+_CWD = os.getcwd() + os.sep
+# 叶子帧为这些函数的栈视为空闲等待（线程池取任务、条件变量、事件循环 select），默认不计入
+_IDLE = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+}
+
+
+class ProfileBusy(Exception):
+    pass
+
+
+def _path(filename: str) -> str:
+    idx = filename.rfind("site-packages" + os.sep)
+    if idx >= 0:
+        return filename[idx + len("site-packages" + os.sep):]
+    if filename.startswith(_CWD):
+        return filename[len(_CWD):]
+    return os.path.basename(filename)
+
+
+class _Session:
+    def __init__(self, requests: Optional[int], seconds: float, interval_ms: float,
+                 torch_ops: bool, include_idle: bool):
+        self.target = requests
+        self.seconds = seconds
+        self.interval = max(1.0, interval_ms) / 1000.0
+        self.torch_ops = torch_ops
+        self.include_idle = include_idle
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds
+        self.done = threading.Event()
+        self.stacks: Counter = Counter()
+        # 算子名 -> [调用次数, 自身 CPU 耗时 us, 含子调用 CPU 耗时 us, 自身设备耗时 us]
+        self.ops: Dict[str, List[float]] = {}
+        self.samples = 0
+        self.requests = 0
+        self.batches = 0
+        self.torch_error: Optional[str] = None
+        self.lock = threading.Lock()
+
+
+class Profiler:
+    """
+    按需剖析：同一时刻只允许一个会话，会话在处理完 N 个请求或到达时长上限后结束。
+    - Python 栈：后台线程按 interval_ms 采样 sys._current_frames()，按线程名为根帧汇总为 collapsed stacks；
+    - torch 算子：模型前向只在微批调度器的工作线程中执行。torch.profiler 只记录开启它的线程，且必须在同一线程中停止，
+      因此由工作线程在会话内的首批前向时开启、会话结束后的下一批结束时停止并汇总，整个会话只解析一次事件。
+    未开启会话时 request_done / record 只做一次属性判断。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session: Optional[_Session] = None
+        # 正在记录的 (会话, torch.profiler)，只在微批调度器工作线程中读写
+        self._torch: Optional[Tuple[_Session, Any]] = None
+
+    def start(self, requests: Optional[int] = None, seconds: Optional[float] = None,
+              interval_ms: Optional[float] = None, torch_ops: bool = True, include_idle: bool = False) -> _Session:
+        if requests is not None and requests < 1:
+            raise ValueError("requests 必须大于 0")
+        if seconds is not None and not 0 < seconds <= _MAX_SECONDS:
+            raise ValueError(f"seconds 必须在 (0, {_MAX_SECONDS:g}] 范围内")
+        # 只按请求数结束的会话仍以 max_seconds 为上限，避免流量低时长期挂起
+        if seconds is None:
+            seconds = _MAX_SECONDS if requests is not None else _DEFAULT_SECONDS
+        session = _Session(requests, seconds, interval_ms or _INTERVAL_MS, torch_ops, include_idle)
+        with self._lock:
+            # 已结束但尚未取走报告的会话（如调用方断开）可被新会话替换
+            if self._session is not None and not self._session.done.is_set():
+                raise ProfileBusy("已有剖析会话在进行中")
+            self._session = session
+        threading.Thread(target=self._sample, args=(session,), name="profiler-sampler", daemon=True).start()
+        return session
+
+    def _sample(self, session: _Session) -> None:
+        me = threading.get_ident()
+        while not session.done.wait(session.interval):
+            if time.monotonic() >= session.deadline:
+                session.done.set()
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if not session.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(f"{frame.f_code.co_name} ({_path(frame.f_code.co_filename)})")
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                session.stacks[";".join(reversed(labels))] += 1
+            session.samples += 1
+
+    def request_done(self) -> None:
+        session = self._session
+        if session is None or session.done.is_set():
+            return
+        with session.lock:
+            session.requests += 1
+            if session.target is not None and session.requests >= session.target:
+                session.done.set()
+
+    @contextmanager
+    def record(self) -> Iterator[None]:
+        """包住一批模型前向，只能在微批调度器工作线程中调用"""
+        session = self._session
+        running = self._torch
+        if running is None and session is not None and session.torch_ops and not session.done.is_set():
+            try:
+                running = self._torch = (session, _torch_profile())
+            except Exception as e:
+                # 剖析失败不影响推理，报告中给出原因
+                session.torch_ops = False
+                session.torch_error = str(e)
+        counted = running is not None and not running[0].done.is_set()
+        try:
+            yield
+        finally:
+            if running is not None:
+                if counted:
+                    with running[0].lock:
+                        running[0].batches += 1
+                if running[0].done.is_set():
+                    self._torch = None
+                    try:
+                        _collect(*running)
+                    except Exception as e:
+                        running[0].torch_error = str(e)
+
+    def finish(self, session: _Session) -> Dict[str, Any]:
+        """结束会话并生成报告；会阻塞到工作线程停止 torch.profiler，需在线程池中调用"""
+        session.done.set()
+        with self._lock:
+            if self._session is session:
+                self._session = None
+        if session.torch_ops:
+            from utils.batcher import get_batcher
+
+            # 排在已提交批次之后的空批次：执行到它时会话内开启的 torch.profiler 已停止并汇总
+            get_batcher().run(("profile",), lambda items: items, [None])
+        with session.lock:
+            ops = dict(session.ops)
+            requests = session.requests
+            batches = session.batches
+
+        collapsed = "\n".join(f"{stack} {count}" for stack, count in session.stacks.most_common())
+        total_self = sum(acc[1] for acc in ops.values()) or 1.0
+        top_ops = [
+            {
+                "name": name,
+                "calls": int(acc[0]),
+                "self_cpu_ms": round(acc[1] / 1000.0, 3),
+                "self_cpu_pct": round(100.0 * acc[1] / total_self, 2),
+                "cpu_total_ms": round(acc[2] / 1000.0, 3),
+                "self_device_ms": round(acc[3] / 1000.0, 3),
+            }
+            for name, acc in sorted(ops.items(), key=lambda x: x[1][1], reverse=True)[:_TOP_OPS]
+        ]
+        return {
+            "seconds": round(time.monotonic() - session.started, 3),
+            "requests": requests,
+            "samples": session.samples,
+            "interval_ms": session.interval * 1000.0,
+            "batches": batches,
+            "top_ops": top_ops,
+            "torch_error": session.torch_error,
+            "collapsed": collapsed,
+        }
+
+
+def _torch_profile() -> Any:
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    prof = profile(activities=activities)
+    prof.start()
+    return prof
+
+
+def _collect(session: _Session, prof: Any) -> None:
+    prof.stop()
+    events = prof.key_averages()
+    with session.lock:
+        for evt in events:
+            acc = session.ops.setdefault(evt.key, [0, 0.0, 0.0, 0.0])
+            acc[0] += evt.count
+            acc[1] += evt.self_cpu_time_total
+            acc[2] += evt.cpu_time_total
+            acc[3] += getattr(evt, "self_cuda_time_total", 0) or 0
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Profiler:
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler()
+        return _profiler
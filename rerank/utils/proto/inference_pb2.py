@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: utils/proto/inference.proto
+# Protobuf Python Version: 6.31.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'utils/proto/inference.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1butils/proto/inference.proto\x12\x0cinference.v1\"U\n\x06Matrix\x12\x0c\n\x04rows\x18\x01 \x01(\r\x12\x0b\n\x03\x64im\x18\x02 \x01(\r\x12\"\n\x05\x64type\x18\x03 \x01(\x0e\x32\x13.inference.v1.DType\x12\x0c\n\x04\x64\x61ta\x18\x04 \x01(\x0c\"\x87\x01\n\x0c\x45mbedRequest\x12\r\n\x05input\x18\x01 \x03(\t\x12\r\n\x05model\x18\x02 \x01(\t\x12\x10\n\x08\x63hunking\x18\x03 \x01(\x08\x12\x0f\n\x07pooling\x18\x04 \x01(\t\x12\"\n\x05\x64type\x18\x05 \x01(\x0e\x32\x13.inference.v1.DType\x12\x12\n\nrequest_id\x18\x06 \x01(\t\"s\n\rEmbedResponse\x12(\n\nembeddings\x18\x01 \x01(\x0b\x32\x14.inference.v1.Matrix\x12\r\n\x05model\x18\x02 \x01(\t\x12\x15\n\rprompt_tokens\x18\x03 \x01(\r\x12\x12\n\nrequest_id\x18\x04 \x01(\t\"\xa8\x02\n\rRerankRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\x11\n\tdocuments\x18\x02 \x03(\t\x12\r\n\x05model\x18\x03 \x01(\t\x12\x12\n\x05top_n\x18\x04 \x01(\rH\x00\x88\x01\x01\x12\x10\n\x08passages\x18\x05 \x01(\x08\x12\x0f\n\x07pooling\x18\x06 \x01(\t\x12\x0c\n\x04mode\x18\x07 \x01(\t\x12\x0f\n\x07\x63\x61scade\x18\x08 \x01(\x08\x12\x16\n\tshortlist\x18\t \x01(\rH\x01\x88\x01\x01\x12-\n\x0fquery_embedding\x18\n \x01(\x0b\x32\x14.inference.v1.Matrix\x12\x31\n\x13\x64ocument_embeddings\x18\x0b \x01(\x0b\x32\x14.inference.v1.MatrixB\x08\n\x06_top_nB\x0c\n\n_shortlist\"\"\n\x04Span\x12\r\n\x05start\x18\x01 \x01(\r\x12\x0b\n\x03\x65nd\x18\x02 \x01(\r\"[\n\x0cRerankResult\x12\r\n\x05index\x18\x01 \x01(\r\x12\x17\n\x0frelevance_score\x18\x02 \x01(\x02\x12#\n\x07passage\x18\x03 \x01(\x0b\x32\x12.inference.v1.Span\"1\n\x0cRerankStages\x12\x11\n\tprefilter\x18\x01 \x01(\r\x12\x0e\n\x06rerank\x18\x02 \x01(\r\"u\n\x0eRerankResponse\x12\n\n\x02id\x18\x01 \x01(\t\x12+\n\x07results\x18\x02 \x03(\x0b\x32\x1a.inference.v1.RerankResult\x12*\n\x06stages\x18\x03 \x01(\x0b\x32\x1a.inference.v1.RerankStages*!\n\x05\x44Type\x12\x0b\n\x07\x46LOAT32\x10\x00\x12\x0b\n\x07\x46LOAT16\x10\x01\x32\x99\x01\n\tEmbedding\x12@\n\x05\x45mbed\x12\x1a.inference.v1.EmbedRequest\x1a\x1b.inference.v1.EmbedResponse\x12J\n\x0b\x45mbedStream\x12\x1a.inference.v1.EmbedRequest\x1a\x1b.inference.v1.EmbedResponse(\x01\x30\x01\x32M\n\x06Rerank\x12\x43\n\x06Rerank\x12\x1b.inference.v1.RerankRequest\x1a\x1c.inference.v1.RerankResponseb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'utils.proto.inference_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_DTYPE']._serialized_start=985
+  _globals['_DTYPE']._serialized_end=1018
+  _globals['_MATRIX']._serialized_start=45
+  _globals['_MATRIX']._serialized_end=130
+  _globals['_EMBEDREQUEST']._serialized_start=133
+  _globals['_EMBEDREQUEST']._serialized_end=268
+  _globals['_EMBEDRESPONSE']._serialized_start=270
+  _globals['_EMBEDRESPONSE']._serialized_end=385
+  _globals['_RERANKREQUEST']._serialized_start=388
+  _globals['_RERANKREQUEST']._serialized_end=684
+  _globals['_SPAN']._serialized_start=686
+  _globals['_SPAN']._serialized_end=720
+  _globals['_RERANKRESULT']._serialized_start=722
+  _globals['_RERANKRESULT']._serialized_end=813
+  _globals['_RERANKSTAGES']._serialized_start=815
+  _globals['_RERANKSTAGES']._serialized_end=864
+  _globals['_RERANKRESPONSE']._serialized_start=866
+  _globals['_RERANKRESPONSE']._serialized_end=983
+  _globals['_EMBEDDING']._serialized_start=1021
+  _globals['_EMBEDDING']._serialized_end=1174
+  _globals['_RERANK']._serialized_start=1176
+  _globals['_RERANK']._serialized_end=1253
+# @@protoc_insertion_point(module_scope)
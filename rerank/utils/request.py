@@ -4,8 +4,62 @@ from typing import List, Optional
 from pydantic import BaseModel
 
 
+class EmbeddingsRequest(BaseModel):
+    input: List[str]
+    model: Optional[str] = None
+    # 长文本分块池化（mean | weighted_mean），pooling 缺省取配置 embedding.chunking.pooling
+    chunking: bool = False
+    pooling: Optional[str] = None
+
+
+class SimilarityRequest(BaseModel):
+    queries: List[str]
+    texts: List[str]
+    model: Optional[str] = None
+    # 缺省返回完整 N×M 分数矩阵，指定后每个 query 只返回前 top_k 个 text 的下标与分数
+    top_k: Optional[int] = None
+    chunking: bool = False
+    pooling: Optional[str] = None
+
+
 class RerankRequest(BaseModel):
     model: Optional[str] = None
     query: str
     documents: List[str]
     top_n: Optional[int] = None
+    # 长文档段落级打分（max | topk_mean），pooling 缺省取配置 rerank.passages.pooling
+    passages: bool = False
+    pooling: Optional[str] = None
+    # 打分方式：cross_encoder（默认，FlagReranker）| colbert（bge-m3 多向量 MaxSim，model 取 rerank.colbert.models）
+    mode: Optional[str] = None
+    # 两阶段级联：先按 bi-encoder 余弦相似度预筛出 shortlist 个候选（缺省取配置 rerank.cascade.shortlist），再精排
+    # 预筛向量缺省由本地 bge-m3 计算，也可由调用方通过 query_embedding + document_embeddings 提供
+    cascade: bool = False
+    shortlist: Optional[int] = None
+    query_embedding: Optional[List[float]] = None
+    document_embeddings: Optional[List[List[float]]] = None
+
+
+class RerankRecallRequest(RerankRequest):
+    # 待评估的各 shortlist 大小，以全量精排的 top_n（缺省 10）为基准计算召回率
+    shortlists: List[int]
+
+
+class ModelLoadRequest(BaseModel):
+    name: str
+    # 缺省为当前配置路径（原地更新权重后重新加载）；新增模型时必填
+    path: Optional[str] = None
+
+
+class ModelUnloadRequest(BaseModel):
+    name: str
+
+
+class ProfileRequest(BaseModel):
+    # 会话在处理完 requests 个业务请求或经过 seconds 秒后结束（先到者为准），均缺省时按配置 profiling.default_seconds
+    requests: Optional[int] = None
+    seconds: Optional[float] = None
+    interval_ms: Optional[float] = None
+    # 是否记录 torch 算子耗时；include_idle 为 true 时保留空闲等待线程的栈
+    torch_ops: bool = True
+    include_idle: bool = False
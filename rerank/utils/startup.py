@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import time
+from typing import Any, Dict, List
+
+from config.loader import cfg
+from utils.model_pool import get_model_pool
+
+# 服务按需延迟导入的重依赖，按导入顺序分别计时（后者只统计增量）
+_HEAVY_MODULES = ("torch", "transformers", "FlagEmbedding")
+
+# 编译模式下各长度桶在预热时编译，未预热的模型会在首个请求时于微批调度器线程中编译并阻塞其余请求
+_COMPILE_ENABLED = bool((cfg.get("compile") or {}).get("enabled", False))
+
+
+def profile_startup(app_import_seconds: float) -> Dict[str, Any]:
+    """
+    启动耗时分解（server.py --profile-startup）：
+    应用导入 -> 重依赖导入 -> 各模型加载（含引擎缓存命中情况见日志）-> 预热。
+    """
+    report: Dict[str, Any] = {"app_import": round(app_import_seconds, 3), "imports": {}, "models": []}
+
+    for module in _HEAVY_MODULES:
+        start = time.perf_counter()
+        __import__(module)
+        report["imports"][module] = round(time.perf_counter() - start, 3)
+
+    pool = get_model_pool()
+    for kind in pool.kinds():
+        for name in pool.names(kind):
+            timings = pool.preload(kind, name)
+            report["models"].append({"kind": kind, "name": name, **timings})
+
+    report["total"] = round(
+        report["app_import"]
+        + sum(report["imports"].values())
+        + sum(m["load"] + m["warmup"] for m in report["models"]),
+        3,
+    )
+    return report
+
+
+def preload_resident() -> List[Dict[str, Any]]:
+    """服务启动时加载并预热常驻模型（pinned）；开启编译模式时加载并预热全部模型，各长度桶在开始服务前编译完成"""
+    pool = get_model_pool()
+    loaded = []
+    for kind in pool.kinds():
+        for name in pool.names(kind) if _COMPILE_ENABLED else pool.pinned(kind):
+            loaded.append({"kind": kind, "name": name, **pool.preload(kind, name)})
+    return loaded
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# 共享 utils 以 embedding/ 为准（与 rerank/utils 逐字节一致，见 test_utils_parity.py）；
+# config.loader 按当前目录读取 config/config.{ENV}.yml
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_EMBEDDING = os.path.join(_ROOT, "embedding")
+os.environ.setdefault("ENV", "dev")
+os.chdir(_EMBEDDING)
+if _EMBEDDING not in sys.path:
+    sys.path.insert(0, _EMBEDDING)
+# 与合并部署相同：rerank/ 排在其后，service 作为命名空间包同时包含两个服务模块（rerank 配置段缺省时取默认值）
+_RERANK = os.path.join(_ROOT, "rerank")
+if _RERANK not in sys.path:
+    sys.path.append(_RERANK)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import types
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from config.loader import cfg
+from controller.embedding_controller import router
+from service import embedding_service
+from utils import memory
+from utils.app import create_app
+from utils.batcher import MicroBatcher
+from utils.response import ResponseCode
+
+_HEADERS = {"Authorization": f"Bearer {(cfg.get('auth') or {}).get('keys', [''])[0]}"}
+# 桩估算：每批按 批大小 × 最长 token 数 × 10 字节计，上限 100 字节
+_LIMIT = 100
+
+
+class _FakeCost:
+    def __init__(self, engine, use_fp16):
+        pass
+
+    def __call__(self, lengths):
+        return len(lengths) * max(lengths) * 10 if lengths else 0
+
+
+class _StubTokenizer:
+    def __call__(self, texts, return_attention_mask=False, return_token_type_ids=False):
+        return {"input_ids": [t.split() for t in texts]}
+
+    def batch_encode_plus(self, texts, **kwargs):
+        return self(texts)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    batches = []
+
+    def encode(texts):
+        batches.append(list(texts))
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    engine = types.SimpleNamespace(tokenizer=_StubTokenizer(), encode=encode)
+    batcher = MicroBatcher(max_batch_size=64, max_wait_ms=0, memory_limit_bytes=_LIMIT)
+    monkeypatch.setattr(memory, "_ENABLED", True)
+    monkeypatch.setattr(memory, "ActivationCost", _FakeCost)
+    monkeypatch.setattr(embedding_service, "_engine", lambda model_name: engine)
+    monkeypatch.setattr(embedding_service, "get_batcher", lambda: batcher)
+    with TestClient(create_app(router)) as c:
+        c.batches = batches
+        yield c
+
+
+def test_over_budget_batch_is_sliced(client):
+    inputs = [f"w{i} x" for i in range(6)]
+    resp = client.post("/v1/embeddings", json={"input": inputs}, headers=_HEADERS)
+    assert resp.status_code == ResponseCode.SUCCESS
+    assert len(resp.json()["data"]["data"][0]["dense"]) == 6
+    # 6 × 2 × 10 = 120 超过上限，前 5 条一批（100），剩余一条进入下一批
+    assert client.batches == [inputs[:5], inputs[5:]]
+
+
+def test_single_input_over_budget_is_rejected_with_413(client):
+    resp = client.post("/v1/embeddings", json={"input": ["ok", " ".join("w" * 11)]}, headers=_HEADERS)
+    assert resp.status_code == ResponseCode.TOO_LARGE
+    assert resp.json()["code"] == ResponseCode.TOO_LARGE
+    assert client.batches == []
+
+
+def test_activation_cost_pads_to_longest_and_truncates():
+    config = types.SimpleNamespace(
+        hidden_size=8, num_attention_heads=2, intermediate_size=32, max_position_embeddings=16
+    )
+    engine = types.SimpleNamespace(model=types.SimpleNamespace(config=config), max_length=10)
+    cost = memory.ActivationCost(engine, use_fp16=False)
+    per_token = 7 * 8 + 2 * 32
+
+    def expected(batch, length):
+        return batch * (length * per_token + 2 * 2 * length * length) * 4 * memory._SAFETY_FACTOR
+
+    assert cost([]) == 0
+    assert cost([3, 5]) == int(expected(2, 5))
+    # 超过 max_length 的输入按截断后的长度计算；fp16 减半
+    assert cost([40]) == int(expected(1, 10))
+    assert memory.ActivationCost(engine, use_fp16=True)([3, 5]) == int(expected(2, 5) / 2)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import contextvars
+import threading
+import time
+
+import pytest
+
+from utils.batcher import MicroBatcher
+from utils.deadline import CancelToken, RequestCancelled, bind_token
+from utils.memory import MemoryLimitExceeded
+
+
+def _recorder(batches, gate=None):
+    def runner(items):
+        batches.append(list(items))
+        if gate is not None:
+            gate.wait(5)
+        return [x * 10 for x in items]
+
+    return runner
+
+
+def _wait_started(batches):
+    while not batches:
+        time.sleep(0.001)
+
+
+def _submit_with_token(batcher, token, *args, **kwargs):
+    ctx = contextvars.copy_context()
+    ctx.run(bind_token, token)
+    return ctx.run(batcher.submit, *args, **kwargs)
+
+
+def test_large_job_is_sliced_in_submission_order():
+    batches = []
+    batcher = MicroBatcher(max_batch_size=4, max_wait_ms=0)
+    assert batcher.run("k", _recorder(batches), list(range(10))) == [x * 10 for x in range(10)]
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_jobs_with_same_key_are_merged_and_split_back():
+    batches = []
+    gate = threading.Event()
+    batcher = MicroBatcher(max_batch_size=8, max_wait_ms=0)
+    first = batcher.submit("k", _recorder(batches, gate), [1])
+    # 工作线程阻塞在第一批时提交的任务合并为一批
+    _wait_started(batches)
+    a = batcher.submit("k", _recorder(batches), [2, 3])
+    other = batcher.submit("other", _recorder(batches), [9])
+    b = batcher.submit("k", _recorder(batches), [4])
+    gate.set()
+    assert first.result(5) == [10]
+    assert a.result(5) == [20, 30]
+    assert b.result(5) == [40]
+    assert other.result(5) == [90]
+    assert batches == [[1], [2, 3, 4], [9]]
+
+
+def test_expired_job_is_dropped_between_slices():
+    batches = []
+    token = CancelToken()
+
+    def runner(items):
+        batches.append(list(items))
+        token.cancel("client_disconnected")
+        return list(items)
+
+    batcher = MicroBatcher(max_batch_size=2, max_wait_ms=0)
+    fut = _submit_with_token(batcher, token, "k", runner, [1, 2, 3, 4, 5])
+    with pytest.raises(RequestCancelled) as e:
+        fut.result(5)
+    assert e.value.reason == "client_disconnected"
+    assert batches == [[1, 2]]
+
+
+def test_runner_error_fails_every_job_in_batch():
+    gate = threading.Event()
+    batches = []
+    batcher = MicroBatcher(max_batch_size=8, max_wait_ms=0)
+    first = batcher.submit("k", _recorder(batches, gate), [1])
+    _wait_started(batches)
+
+    def boom(items):
+        raise ValueError("boom")
+
+    a = batcher.submit("k", boom, [2])
+    b = batcher.submit("k", boom, [3])
+    gate.set()
+    assert first.result(5) == [10]
+    for fut in (a, b):
+        with pytest.raises(ValueError):
+            fut.result(5)
+
+
+def _cost(lengths):
+    # 按最长输入补齐：批大小 × 最长 token 数
+    return len(lengths) * max(lengths)
+
+
+def test_memory_limit_cuts_batches():
+    batches = []
+    batcher = MicroBatcher(max_batch_size=64, max_wait_ms=0, memory_limit_bytes=100)
+    lengths = [10, 10, 10, 50, 5]
+    out = batcher.run("k", _recorder(batches), list(range(5)), lengths=lengths, cost=_cost)
+    assert out == [0, 10, 20, 30, 40]
+    # 加入 50 后预估 4 × 50 = 200 超限，截断；[50, 5] 预估 2 × 50 = 100 恰好不超限
+    assert batches == [[0, 1, 2], [3, 4]]
+
+
+def test_single_item_over_limit_is_rejected_on_submit():
+    batcher = MicroBatcher(max_batch_size=64, max_wait_ms=0, memory_limit_bytes=100)
+    with pytest.raises(MemoryLimitExceeded) as e:
+        batcher.submit("k", _recorder([]), [1, 2], lengths=[10, 200], cost=_cost)
+    assert e.value.need == 200
+    assert e.value.limit == 100
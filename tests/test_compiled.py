@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import types
+
+import pytest
+import torch
+
+from utils import compiled, startup
+from utils.compiled import BucketedModel, install_compiled, warmup_compiled
+from utils.model_pool import ModelPool
+
+
+class _TinyEncoder(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.config = types.SimpleNamespace(vocab_size=100)
+        self.embeddings = torch.nn.Embedding(100, 4)
+
+    def forward(self, input_ids=None, attention_mask=None, token_type_ids=None, return_dict=True):
+        return {"last_hidden_state": self.embeddings(input_ids) * attention_mask.unsqueeze(-1)}
+
+
+def _factory(name, path):
+    engine = types.SimpleNamespace(model=_TinyEncoder())
+    install_compiled(engine, "last_hidden_state", "cpu", False, 0)
+    return engine
+
+
+@pytest.mark.filterwarnings("ignore::torch.jit.TracerWarning")
+def test_startup_compiles_every_bucket_before_first_get(monkeypatch):
+    pool = ModelPool()
+    pool.register("k", {"a": "a", "b": "b"}, _factory, warmup_compiled)
+    monkeypatch.setattr(startup, "get_model_pool", lambda: pool)
+    monkeypatch.setattr(startup, "_COMPILE_ENABLED", True)
+
+    # 开启编译模式时非常驻模型也在启动时预热
+    loaded = startup.preload_resident()
+    assert [m["name"] for m in loaded] == ["a", "b"]
+    assert all(b["compiled"] for m in loaded for b in m["compile"]["buckets"])
+
+    built = []
+    monkeypatch.setattr(BucketedModel, "_build", lambda self, bucket: built.append(bucket))
+    for name in ("a", "b"):
+        model = pool.get("k", name).model
+        assert sorted(model._graphs) == compiled._BUCKETS
+        assert all(graph is not None for graph in model._graphs.values())
+        input_ids = torch.randint(5, 100, (2, 7))
+        out = model(input_ids=input_ids, attention_mask=torch.ones_like(input_ids))
+        assert out.last_hidden_state.shape == (2, 7, 4)
+    # 请求路径上不再编译
+    assert built == []
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import re
+import types
+
+import numpy as np
+import pytest
+
+from service import embedding_service
+
+
+def _tokenizer(text, add_special_tokens=False, return_offsets_mapping=True):
+    # 按空白切分的桩分词器，只返回 offset_mapping
+    return {"offset_mapping": [m.span() for m in re.finditer(r"\S+", text)]}
+
+
+def _text(n, prefix="t"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+@pytest.fixture
+def windows(monkeypatch):
+    monkeypatch.setattr(embedding_service, "_WINDOW_TOKENS", 4)
+    monkeypatch.setattr(embedding_service, "_OVERLAP_TOKENS", 1)
+
+
+def test_short_text_is_a_single_window(windows):
+    assert embedding_service._split_windows(_tokenizer, "a  b c ") == [("a  b c ", 3)]
+
+
+def test_windows_overlap_and_cut_at_token_offsets(windows):
+    text = _text(11)
+    assert embedding_service._split_windows(_tokenizer, text) == [
+        ("t0 t1 t2 t3", 4), ("t3 t4 t5 t6", 4), ("t6 t7 t8 t9", 4), ("t9 t10", 2),
+    ]
+    # 恰好在窗口末尾结束时不再产生只含重叠部分的窗口
+    assert [c for _, c in embedding_service._split_windows(_tokenizer, _text(10))] == [4, 4, 4]
+
+
+def test_mean_and_weighted_mean_are_renormalized():
+    vectors = np.array([[1.0, 0.0], [0.0, 1.0]])
+    mean = embedding_service._pool(vectors, [3, 1], "mean")
+    weighted = embedding_service._pool(vectors, [3, 1], "weighted_mean")
+    assert np.allclose(mean, [2 ** -0.5, 2 ** -0.5])
+    assert np.allclose(weighted, np.array([3.0, 1.0]) / 10 ** 0.5)
+    # 权重为 0 的窗口按 1 计，零向量保持为零
+    assert np.allclose(embedding_service._pool(vectors, [0, 0], "weighted_mean"), mean)
+    assert np.allclose(embedding_service._pool(np.zeros((2, 2)), [1, 1], "mean"), 0.0)
+
+
+def test_chunked_encoding_pools_windows_per_input(windows):
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t.split()), 1.0] for t in texts])
+
+    engine = types.SimpleNamespace(tokenizer=_tokenizer, encode=encode)
+    texts = ["a b", _text(7), "c"]
+    pooled = embedding_service._encode_chunked("m", engine, texts, "weighted_mean")
+
+    # 所有输入的窗口合为一次编码
+    assert calls == [["a b", "t0 t1 t2 t3", "t3 t4 t5 t6", "c"]]
+    expected = [
+        embedding_service._pool(np.array([[2.0, 1.0]]), [2], "weighted_mean"),
+        embedding_service._pool(np.array([[4.0, 1.0], [4.0, 1.0]]), [4, 4], "weighted_mean"),
+        embedding_service._pool(np.array([[1.0, 1.0]]), [1], "weighted_mean"),
+    ]
+    assert np.allclose(pooled, np.stack(expected))
+    assert np.allclose(np.linalg.norm(pooled, axis=1), 1.0)
+
+
+_VECTORS = {
+    "q0": [1.0, 0.0],
+    "q1": [0.0, 1.0],
+    "a": [0.9, 0.1],
+    "b": [0.2, 0.8],
+    "c": [0.5, 0.5],
+    "d": [0.5, 0.5],
+}
+
+
+@pytest.fixture
+def fixed_vectors(monkeypatch):
+    # 查询与候选的向量按输入文本查表，点积即为给定的相似度
+    def embed_dense(texts, model_name, chunking, pooling):
+        return np.array([_VECTORS[t] for t in texts], dtype=np.float32)
+
+    monkeypatch.setattr(embedding_service, "embed_dense", embed_dense)
+
+
+def test_similarity_full_matrix(fixed_vectors):
+    scores = embedding_service.similarity(["q0", "q1"], ["a", "b"], "m")["scores"]
+    assert np.allclose(scores, [[0.9, 0.2], [0.1, 0.8]])
+
+
+def test_top_k_is_sorted_per_row(fixed_vectors):
+    top = embedding_service.similarity(["q0", "q1"], ["a", "b", "c"], "m", top_k=2)["top_k"]
+    assert [row["indices"] for row in top] == [[0, 2], [1, 2]]
+    assert np.allclose([row["scores"] for row in top], [[0.9, 0.5], [0.8, 0.5]])
+
+
+def test_top_k_is_clamped_to_candidates(fixed_vectors):
+    texts = ["a", "b", "c"]
+    for k in (3, 10):
+        top = embedding_service.similarity(["q0"], texts, "m", top_k=k)["top_k"][0]
+        assert top["indices"] == [0, 2, 1]
+    assert embedding_service.similarity(["q0"], texts, "m", top_k=0)["top_k"][0]["indices"] == [0]
+
+
+def test_top_k_with_ties_keeps_distinct_indices(fixed_vectors):
+    top = embedding_service.similarity(["q1"], ["a", "c", "d", "b"], "m", top_k=2)["top_k"][0]
+    assert top["indices"][0] == 3
+    # c 与 d 同分，任取其一，但下标不重复且分数与下标对应
+    assert top["indices"][1] in (1, 2)
+    top = embedding_service.similarity(["q1"], ["c", "d", "a"], "m", top_k=2)["top_k"][0]
+    assert sorted(top["indices"]) == [0, 1]
+    assert np.allclose(top["scores"], [0.5, 0.5])
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+import time
+
+import grpc
+import numpy as np
+import pytest
+
+from config.loader import cfg
+from utils import grpc_server
+from utils.deadline import check_cancelled
+from utils.proto import inference_pb2 as pb
+from utils.proto import inference_pb2_grpc as pb_grpc
+
+_METADATA = [("authorization", f"Bearer {(cfg.get('auth') or {}).get('keys', [''])[0]}")]
+
+
+class _StubEmbedding:
+    """按文本长度生成向量的桩服务；delay 中的文本模拟慢请求，gate 未打开前所有请求阻塞"""
+
+    def __init__(self, delay=None):
+        self.delay = delay or {}
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = 0
+        self.lock = threading.Lock()
+
+    def embed_dense(self, texts, model_name, chunking, pooling):
+        with self.lock:
+            self.started += 1
+        self.gate.wait(5)
+        for text in texts:
+            time.sleep(self.delay.get(text, 0))
+        check_cancelled()
+        return np.array([[len(t), 0.5, -1.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def stub():
+    return _StubEmbedding()
+
+
+@pytest.fixture
+def channel(stub, monkeypatch):
+    def _init(servicer):
+        # 不导入真实服务模块，直接注入桩函数
+        servicer._poolings = {"mean"}
+        servicer._embed_dense = stub.embed_dense
+        servicer._model_names = lambda: ["m"]
+        servicer._token_count = lambda texts, model_name: [len(t) for t in texts]
+
+    monkeypatch.setattr(grpc_server._EmbeddingServicer, "__init__", _init)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = grpc_server.start_grpc_server(["embedding"], port)
+    chan = grpc.insecure_channel(f"127.0.0.1:{port}")
+    yield pb_grpc.EmbeddingStub(chan)
+    chan.close()
+    server.stop(grace=None)
+
+
+def _request(texts, request_id="", dtype=pb.FLOAT32):
+    return pb.EmbedRequest(input=texts, model="m", dtype=dtype, request_id=request_id)
+
+
+def _vectors(response):
+    return grpc_server._unpack(response.embeddings, "embeddings")
+
+
+def test_matrix_round_trip():
+    matrix = np.arange(12, dtype=np.float32).reshape(3, 4) / 7
+    assert np.array_equal(grpc_server._unpack(grpc_server._pack(matrix, pb.FLOAT32), "m"), matrix)
+    half = grpc_server._unpack(grpc_server._pack(matrix, pb.FLOAT16), "m")
+    assert half.dtype == np.float32
+    assert np.allclose(half, matrix, atol=1e-3)
+    assert grpc_server._unpack(pb.Matrix(), "m") is None
+    with pytest.raises(grpc_server._InvalidArgument):
+        grpc_server._unpack(pb.Matrix(rows=2, dim=4, dtype=pb.FLOAT32, data=b"\0" * 12), "m")
+
+
+def test_embed_returns_packed_matrix(channel):
+    response = channel.Embed(_request(["a", "bbb"], "r1", pb.FLOAT16), metadata=_METADATA)
+    assert response.request_id == "r1"
+    assert response.prompt_tokens == 4
+    assert (response.embeddings.rows, response.embeddings.dim) == (2, 3)
+    assert np.array_equal(_vectors(response), [[1, 0.5, -1], [3, 0.5, -1]])
+
+
+def test_embed_stream_keeps_order_within_window(channel, stub, monkeypatch):
+    monkeypatch.setattr(grpc_server, "_STREAM_WINDOW", 2)
+    stub.gate.clear()
+    responses = channel.EmbedStream(
+        iter([_request(["x" * (i + 1)], str(i)) for i in range(20)]), metadata=_METADATA
+    )
+    time.sleep(0.3)
+    # 结果未被取走前，在途请求数受窗口限制：队列 2 条 + 等待入队 1 条 + 正在等待结果 1 条
+    assert stub.started <= 4
+    stub.gate.set()
+    results = [(r.request_id, _vectors(r)[0, 0]) for r in responses]
+    assert results == [(str(i), i + 1) for i in range(20)]
+
+
+def test_embed_stream_times_out_messages_individually(channel, monkeypatch):
+    monkeypatch.setitem(cfg["app"], "request_timeout_ms", 300)
+
+    def requests():
+        # 整个流的持续时间超过单条超时，每条消息仍只按自身耗时计时
+        for i in range(4):
+            time.sleep(0.15)
+            yield _request(["a"], str(i))
+
+    results = [r.request_id for r in channel.EmbedStream(requests(), metadata=_METADATA)]
+    assert results == ["0", "1", "2", "3"]
+
+
+def test_embed_stream_aborts_on_slow_message(channel, stub, monkeypatch):
+    monkeypatch.setitem(cfg["app"], "request_timeout_ms", 200)
+    stub.delay["slow"] = 0.4
+    responses = channel.EmbedStream(iter([_request(["a"], "0"), _request(["slow"], "1")]), metadata=_METADATA)
+    assert next(responses).request_id == "0"
+    with pytest.raises(grpc.RpcError) as exc:
+        next(responses)
+    assert exc.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from utils import startup
+from utils.app import create_app
+from utils.model_pool import ModelPool
+
+
+def _model_dir(tmp_path, name, nbytes=100):
+    # 加载前按权重文件大小估算占用，桩引擎没有参数时沿用该估算值
+    path = tmp_path / name
+    path.mkdir()
+    (path / "model.safetensors").write_bytes(b"\0" * nbytes)
+    return str(path)
+
+
+def _pool(tmp_path, names, budget=0, pinned=(), warmed=None):
+    pool = ModelPool(memory_budget_bytes=budget)
+    models = {name: _model_dir(tmp_path, name) for name in names}
+    warmup = (lambda engine: warmed.append(engine)) if warmed is not None else None
+    pool.register("k", models, lambda name, path: f"engine:{name}", warmup, pinned=pinned)
+    return pool
+
+
+def _loaded(pool):
+    return [m["name"] for m in pool.status("k") if m["loaded"]]
+
+
+def test_least_recently_used_model_is_evicted_over_budget(tmp_path):
+    pool = _pool(tmp_path, ["a", "b", "c"], budget=250)
+    pool.get("k", "a")
+    pool.get("k", "b")
+    pool.get("k", "a")
+    assert pool.get("k", "c") == "engine:c"
+    assert _loaded(pool) == ["a", "c"]
+
+
+def test_pinned_model_is_never_evicted(tmp_path):
+    pool = _pool(tmp_path, ["a", "b", "c"], budget=250, pinned=["a"])
+    for name in ("a", "b", "c", "b"):
+        pool.get("k", name)
+    # a 最久未用但为常驻模型，每次都淘汰另一个非常驻模型
+    assert _loaded(pool) == ["a", "b"]
+
+
+def test_stale_load_does_not_overwrite_finished_swap():
+    loading, release, swapped = threading.Event(), threading.Event(), threading.Event()
+
+    def factory(name, path):
+        if path == "old":
+            loading.set()
+            release.wait(5)
+        else:
+            swapped.set()
+        return path
+
+    pool = ModelPool()
+    pool.register("k", {"m": "old"}, factory)
+    loader = threading.Thread(target=pool.get, args=("k", "m"))
+    loader.start()
+    loading.wait(5)
+    fut = pool.swap("k", "m", "new")
+    # 新版本加载完成后再放行旧版本的按需加载
+    swapped.wait(5)
+    time.sleep(0.05)
+    release.set()
+    loader.join(5)
+    assert fut.result(5) == "new"
+    assert pool.get("k", "m") == "new"
+    assert pool.status("k")[0]["swap"]["state"] == "ready"
+
+
+def test_pinned_models_are_preloaded_and_warmed(tmp_path, monkeypatch):
+    warmed = []
+    pool = _pool(tmp_path, ["a", "b"], pinned=["b"], warmed=warmed)
+    monkeypatch.setattr(startup, "get_model_pool", lambda: pool)
+    loaded = startup.preload_resident()
+    assert [(m["kind"], m["name"]) for m in loaded] == [("k", "b")]
+    assert warmed == ["engine:b"]
+    assert _loaded(pool) == ["b"]
+
+
+def test_app_preloads_pinned_models_before_serving(tmp_path, monkeypatch):
+    pool = _pool(tmp_path, ["a", "b"], pinned=["a"])
+    monkeypatch.setattr(startup, "get_model_pool", lambda: pool)
+    with TestClient(create_app()):
+        assert _loaded(pool) == []
+    with TestClient(create_app(preload=True)):
+        assert _loaded(pool) == ["a"]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config.loader import cfg
+from utils.admin import build_process_admin_router
+from utils.app import create_app
+from utils.profiler import ProfileBusy, Profiler, get_profiler
+from utils.response import ResponseCode
+
+_ADMIN_HEADERS = {"Authorization": f"Bearer {(cfg.get('auth') or {}).get('admin_keys', [''])[0]}"}
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampler_collects_collapsed_stacks_per_thread():
+    profiler = Profiler()
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        session = profiler.start(seconds=0.3, interval_ms=5, torch_ops=False)
+        session.done.wait(2)
+        report = profiler.finish(session)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert report["samples"] > 0
+    lines = report["collapsed"].splitlines()
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy
+    stack, count = busy[0].rsplit(" ", 1)
+    # 以线程名为根帧，叶子帧为正在执行的函数
+    assert stack.split(";")[-1].startswith("_spin (")
+    assert int(count) > 0
+    # 空闲等待的线程默认不计入
+    assert not any(line.split(";")[-1].startswith("wait (threading.py)") for line in lines)
+
+
+def test_session_ends_after_requested_number_of_requests():
+    profiler = Profiler()
+    session = profiler.start(requests=2, torch_ops=False)
+    profiler.request_done()
+    assert not session.done.is_set()
+    profiler.request_done()
+    assert session.done.is_set()
+    assert profiler.finish(session)["requests"] == 2
+
+
+def test_overlapping_sessions_are_rejected():
+    profiler = Profiler()
+    session = profiler.start(seconds=5, torch_ops=False)
+    with pytest.raises(ProfileBusy):
+        profiler.start(seconds=1, torch_ops=False)
+    profiler.finish(session)
+    profiler.finish(profiler.start(seconds=0.05, torch_ops=False))
+
+
+def test_admin_profile_rejects_overlapping_runs():
+    client = TestClient(create_app(build_process_admin_router()))
+    running = get_profiler().start(seconds=5, torch_ops=False)
+    try:
+        resp = client.post("/admin/profile", json={"seconds": 0.1, "torch_ops": False}, headers=_ADMIN_HEADERS)
+        assert resp.status_code == ResponseCode.PARAM_FAIL
+    finally:
+        get_profiler().finish(running)
+
+    start = time.monotonic()
+    resp = client.post("/admin/profile", json={"seconds": 0.1, "torch_ops": False}, headers=_ADMIN_HEADERS)
+    assert resp.status_code == ResponseCode.SUCCESS
+    assert resp.json()["data"]["samples"] > 0
+    assert time.monotonic() - start < 2
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from utils.replica import _SUB_BATCH_SIZE, _merge_embeddings, _merge_rerank, _split_embeddings, _split_rerank
+
+
+def test_merge_rerank_remaps_indices_to_original_positions():
+    n = _SUB_BATCH_SIZE * 2 + 5
+    documents = [f"doc-{i}" for i in range(n)]
+    payload = {"query": "q", "documents": documents, "top_n": 4}
+    parts = _split_rerank(payload)
+    assert [len(part["documents"]) for part, _ in parts] == [_SUB_BATCH_SIZE, _SUB_BATCH_SIZE, 5]
+    assert all(part["top_n"] is None for part, _ in parts)
+
+    # 副本返回批内下标，分数取原始下标，便于校验还原结果
+    datas = []
+    for start, (part, _) in zip(range(0, n, _SUB_BATCH_SIZE), parts):
+        results = [{"index": i, "relevance_score": float(start + i)} for i in range(len(part["documents"]))]
+        datas.append({"id": "x", "results": results[::-1]})
+
+    merged = _merge_rerank(payload, datas)
+    assert [r["index"] for r in merged["results"]] == [n - 1, n - 2, n - 3, n - 4]
+    assert all(r["relevance_score"] == float(r["index"]) for r in merged["results"])
+
+
+def test_split_rerank_slices_document_embeddings_and_skips_cascade():
+    n = _SUB_BATCH_SIZE + 3
+    payload = {
+        "query": "q",
+        "documents": [str(i) for i in range(n)],
+        "document_embeddings": [[float(i)] for i in range(n)],
+    }
+    parts = _split_rerank(payload)
+    assert parts[1][0]["document_embeddings"] == [[float(i)] for i in range(_SUB_BATCH_SIZE, n)]
+    assert _split_rerank({**payload, "cascade": True}) is None
+    assert _split_rerank({"query": "q", "documents": ["a"]}) is None
+
+
+def test_embeddings_are_split_and_concatenated_in_order():
+    n = _SUB_BATCH_SIZE + 2
+    payload = {"input": [f"t{i}" for i in range(n)], "model": "m"}
+    parts = _split_embeddings(payload)
+    assert [part["input"] for part, _ in parts] == [payload["input"][:_SUB_BATCH_SIZE], payload["input"][_SUB_BATCH_SIZE:]]
+    assert [tokens for _, tokens in parts] == [sum(len(t) for t in part["input"]) for part, _ in parts]
+
+    datas = [
+        {"model": "m", "data": [{"dense": [[float(i)] for i in range(start, start + len(part["input"]))]}],
+         "usage": {"prompt_tokens": len(part["input"]), "total_tokens": len(part["input"])}}
+        for start, (part, _) in zip(range(0, n, _SUB_BATCH_SIZE), parts)
+    ]
+    merged = _merge_embeddings(payload, datas)
+    assert merged["data"][0]["dense"] == [[float(i)] for i in range(n)]
+    assert merged["usage"] == {"prompt_tokens": n, "total_tokens": n}
+    assert _split_embeddings({"input": ["a"]}) is None
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import re
+
+import numpy as np
+import pytest
+
+from service import rerank_service
+from utils.batcher import get_batcher
+
+
+def _tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, **kwargs):
+    return {"offset_mapping": [m.span() for m in re.finditer(r"\S+", text)]}
+
+
+class _StubReranker:
+    """段落分数为其中 "hit" 的个数，记录每次打分收到的段落"""
+
+    def __init__(self):
+        self.tokenizer = _tokenizer
+        self.calls = []
+
+    def compute_score(self, pairs):
+        self.calls.append([p for _, p in pairs])
+        return [float(p.split().count("hit")) for _, p in pairs]
+
+
+@pytest.fixture
+def passages(monkeypatch):
+    monkeypatch.setattr(rerank_service, "_WINDOW_TOKENS", 3)
+    monkeypatch.setattr(rerank_service, "_OVERLAP_TOKENS", 1)
+
+
+def test_passage_spans_are_character_ranges(passages):
+    assert rerank_service._split_passages(_tokenizer, "a b") == [(0, 3)]
+    doc = "aa b cc d ee f"
+    spans = rerank_service._split_passages(_tokenizer, doc)
+    assert [doc[s:e] for s, e in spans] == ["aa b cc", "cc d ee", "ee f"]
+
+
+def test_passages_are_max_pooled_back_to_documents(passages):
+    rk = _StubReranker()
+    docs = ["x hit y z w", "a b", "hit hit q hit r s t"]
+    results = rerank_service._score_passages("m", rk, "q", docs, "max")
+    # doc0: "x hit y" / "y z w"；doc2: "hit hit q" / "q hit r" / "r s t"
+    assert [score for score, _ in results] == [1.0, 0.0, 2.0]
+    assert [docs[i][s:e] for i, (_, (s, e)) in enumerate(results)] == ["x hit y", "a b", "hit hit q"]
+
+
+def test_topk_mean_pooling(passages, monkeypatch):
+    monkeypatch.setattr(rerank_service, "_TOP_K", 2)
+    results = rerank_service._score_passages("m", _StubReranker(), "q", ["hit hit q hit r s t"], "topk_mean")
+    assert results[0][0] == 1.5
+
+
+def test_pairs_are_length_sorted_and_scores_restored(passages):
+    rk = _StubReranker()
+    docs = ["hit", "bb hit cccccc", "dddd eeeeeeeeee"]
+    results = rerank_service._score_passages("m", rk, "q", docs, "max")
+    # 提交给调度器前按段落长度降序排列
+    submitted = [p for call in rk.calls for p in call]
+    assert submitted == sorted(submitted, key=len, reverse=True)
+    assert [score for score, _ in results] == [1.0, 1.0, 0.0]
+    assert results[2][1] == (0, len(docs[2]))
+
+
+def test_duplicate_documents_are_scored_once(passages):
+    rk = _StubReranker()
+    scored = rerank_service._score_unique("m", rk, "q", ["hit", "a", "hit"], "cross_encoder", False, "max")
+    assert [score for score, _ in scored] == [1.0, 0.0, 1.0]
+    assert sorted(p for call in rk.calls for p in call) == ["a", "hit"]
+
+
+class _StubColbert:
+    """每个字符一个 token 向量：字母序号乘以 step 为其方向角，记录每次编码收到的文本"""
+
+    def __init__(self, step=0.3):
+        self.step = step
+        self.calls = []
+
+    def vectors(self, text):
+        angles = [(ord(ch) - ord("a")) * self.step for ch in text]
+        return np.array([[np.cos(a), np.sin(a)] for a in angles], dtype=np.float32).reshape(-1, 2)
+
+    def encode(self, texts, return_dense=False, return_sparse=False, return_colbert_vecs=False):
+        self.calls.append(list(texts))
+        return {"colbert_vecs": [self.vectors(t) for t in texts]}
+
+
+def _max_sim(query_vecs, doc_vecs):
+    if not len(doc_vecs):
+        doc_vecs = np.zeros((1, query_vecs.shape[1]))
+    return float(np.mean([max(float(q @ d) for d in doc_vecs) for q in query_vecs]))
+
+
+def test_colbert_max_sim_per_document():
+    engine = _StubColbert()
+    docs = ["abc", "z", "", "cab"]
+    scores = rerank_service._score_colbert("maxsim", engine, "ac", docs)
+    query = engine.vectors("ac")
+    # 文档向量以 float16 缓存
+    expected = [_max_sim(query, engine.vectors(d).astype(np.float16).astype(np.float32)) for d in docs]
+    assert np.allclose(scores, expected, atol=1e-3)
+    assert scores[0] == pytest.approx(1.0, abs=1e-3)
+    assert scores[0] == pytest.approx(scores[3], abs=1e-6)
+
+
+def test_colbert_document_vectors_are_cached():
+    engine = _StubColbert()
+    rerank_service._score_colbert("cached", engine, "a", ["abc", "bd"])
+    rerank_service._score_colbert("cached", engine, "b", ["bd", "ce"])
+    assert engine.calls == [["a"], ["abc", "bd"], ["b"], ["ce"]]
+
+
+def test_swapped_engine_never_serves_stale_vectors():
+    old = _StubColbert()
+    stale = rerank_service._score_colbert("swapped", old, "d", ["abc"])
+    old_id = id(old)
+    # 调度器工作线程在取到下一批前仍引用上一批的 runner，先跑一批无关任务再释放旧引擎
+    get_batcher().run("flush", lambda items: items, [None])
+    del old
+    gc.collect()
+    # 尽量让新实例复用旧实例的 id，模拟热切换后旧引擎被回收
+    keep = []
+    for _ in range(1000):
+        new = _StubColbert(step=1.0)
+        if id(new) == old_id:
+            break
+        keep.append(new)
+    fresh = rerank_service._score_colbert("swapped", new, "d", ["abc"])
+    assert new.calls == [["d"], ["abc"]]
+    assert fresh == pytest.approx([_max_sim(new.vectors("d"), new.vectors("abc"))], abs=1e-3)
+    assert fresh != pytest.approx(stale, abs=1e-3)
+
+
+class _StubCrossEncoder(_StubReranker):
+    """精排分数取文档中的数字，便于与预筛分数区分"""
+
+    def compute_score(self, pairs):
+        self.calls.append([p for _, p in pairs])
+        return [float(p.split("-")[1]) for _, p in pairs]
+
+
+@pytest.fixture
+def cross_encoder(monkeypatch):
+    rk = _StubCrossEncoder()
+    monkeypatch.setattr(rerank_service, "_engine_for", lambda mode, model_name: (rk, float))
+    return rk
+
+
+# 预筛（余弦）顺序：d0 > d2 > d4 > d1 > d3 > d5；精排顺序与文档中的数字一致：d5 > d4 > ... > d0
+_DOCS = [f"doc-{i}" for i in range(6)]
+_QUERY_EMBEDDING = [1.0, 0.0]
+_DOC_EMBEDDINGS = [[10.0, 0.0], [1.0, 0.5], [2.0, 0.2], [1.0, 0.9], [3.0, 0.6], [0.0, 1.0]]
+
+
+def test_shortlist_keeps_top_k_in_original_order():
+    scores = np.array([0.1, 0.9, 0.3, 0.8, 0.5])
+    assert rerank_service._shortlist(scores, 3) == [1, 3, 4]
+    assert rerank_service._shortlist(scores, 5) == [0, 1, 2, 3, 4]
+    assert rerank_service._shortlist(scores, 9) == [0, 1, 2, 3, 4]
+
+
+def test_prefilter_normalizes_supplied_embeddings():
+    scores = rerank_service._prefilter_scores("q", _DOCS, [2.0, 0.0], _DOC_EMBEDDINGS)
+    assert np.argsort(-scores, kind="stable").tolist() == [0, 2, 4, 1, 3, 5]
+    assert scores.max() == pytest.approx(1.0)
+
+
+def test_cascade_reranks_only_the_shortlist(cross_encoder):
+    data = rerank_service.compute_rerank(
+        "q", _DOCS, "m", cascade=True, shortlist=3,
+        query_embedding=_QUERY_EMBEDDING, document_embeddings=_DOC_EMBEDDINGS,
+    )
+    assert data["stages"] == {"prefilter": 6, "rerank": 3}
+    assert cross_encoder.calls == [["doc-0", "doc-2", "doc-4"]]
+    assert [(r["index"], r["relevance_score"]) for r in data["results"]] == [(4, 4.0), (2, 2.0), (0, 0.0)]
+
+
+def test_cascade_skips_prefilter_for_small_candidate_sets(cross_encoder):
+    data = rerank_service.compute_rerank("q", _DOCS[:3], "m", top_n=2, cascade=True, shortlist=3)
+    assert data["stages"] == {"prefilter": 0, "rerank": 3}
+    assert [r["index"] for r in data["results"]] == [2, 1]
+    assert "stages" not in rerank_service.compute_rerank("q", _DOCS[:3], "m")
+
+
+def test_cascade_recall_per_shortlist(cross_encoder):
+    data = rerank_service.cascade_recall(
+        "q", _DOCS, "m", [1, 3, 5, 6], top_n=2,
+        query_embedding=_QUERY_EMBEDDING, document_embeddings=_DOC_EMBEDDINGS,
+    )
+    # 全量精排前 2 为 d5、d4；按预筛顺序，shortlist 3 起包含 d4，shortlist 6 才包含 d5
+    assert data["documents"] == 6
+    assert data["top_n"] == 2
+    assert data["recall"] == [
+        {"shortlist": 1, "recall": 0.0},
+        {"shortlist": 3, "recall": 0.5},
+        {"shortlist": 5, "recall": 0.5},
+        {"shortlist": 6, "recall": 1.0},
+    ]
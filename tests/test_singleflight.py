@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import contextvars
+import threading
+import time
+
+import pytest
+
+from utils.deadline import CancelToken, RequestCancelled, bind_token, new_token
+from utils.singleflight import SingleFlight
+
+
+def _start(fn):
+    box = {}
+
+    def run():
+        try:
+            box["result"] = fn()
+        except BaseException as e:
+            box["error"] = e
+
+    t = threading.Thread(target=run)
+    t.start()
+    return t, box
+
+
+def _wait_inflight(flight, key):
+    while key not in flight._calls:
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    gate = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        gate.wait(5)
+        return "v"
+
+    leader = _start(lambda: flight.do("k", compute))
+    _wait_inflight(flight, "k")
+    followers = [_start(lambda: flight.do("k", compute)) for _ in range(3)]
+    time.sleep(0.05)
+    gate.set()
+    for t, box in [leader] + followers:
+        t.join(5)
+        assert box["result"] == "v"
+    assert len(calls) == 1
+    assert "k" not in flight._calls
+
+
+def test_follower_recomputes_after_leader_cancelled():
+    flight = SingleFlight()
+    gate = threading.Event()
+    calls = []
+
+    def leader_fn():
+        calls.append("leader")
+        gate.wait(5)
+        raise RequestCancelled("client_disconnected")
+
+    def follower_fn():
+        calls.append("follower")
+        return "v"
+
+    leader = _start(lambda: flight.do("k", leader_fn))
+    _wait_inflight(flight, "k")
+    follower = _start(lambda: flight.do("k", follower_fn))
+    time.sleep(0.05)
+    gate.set()
+    leader[0].join(5)
+    follower[0].join(5)
+    assert isinstance(leader[1]["error"], RequestCancelled)
+    assert follower[1]["result"] == "v"
+    assert calls == ["leader", "follower"]
+
+
+def test_expired_follower_does_not_recompute():
+    flight = SingleFlight()
+    gate = threading.Event()
+    token = CancelToken()
+    token.cancel("deadline_exceeded")
+
+    def leader_fn():
+        gate.wait(5)
+        raise RequestCancelled("client_disconnected")
+
+    def follower():
+        ctx = contextvars.copy_context()
+        ctx.run(bind_token, token)
+        return ctx.run(flight.do, "k", lambda: "recomputed")
+
+    leader = _start(lambda: flight.do("k", leader_fn))
+    _wait_inflight(flight, "k")
+    t, box = _start(follower)
+    time.sleep(0.05)
+    gate.set()
+    leader[0].join(5)
+    t.join(5)
+    assert isinstance(box["error"], RequestCancelled)
+    assert box["error"].reason == "deadline_exceeded"
+
+
+def test_leader_error_is_raised_and_key_released():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do("k", lambda: 1) == 1
+
+
+def test_child_token_follows_parent():
+    parent = CancelToken()
+    child = new_token(60000, parent=parent)
+    assert not child.expired()
+    parent.cancel("client_disconnected")
+    assert child.expired()
+    assert child.reason == "client_disconnected"
+    # 子令牌自身超时不影响父令牌
+    other_parent = CancelToken()
+    short = CancelToken(time.monotonic() - 1, other_parent)
+    assert short.expired() and short.reason == "deadline_exceeded"
+    assert not other_parent.expired()
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from utils.tokenizer import _fingerprint
+
+
+def _model_dir(root, name, config):
+    path = root / name
+    path.mkdir()
+    (path / "tokenizer.json").write_text('{"vocab": ["a", "b"]}')
+    (path / "tokenizer_config.json").write_text(config)
+    return str(path)
+
+
+def test_fingerprint_includes_tokenizer_config(tmp_path):
+    a = _model_dir(tmp_path, "a", '{"model_max_length": 8192}')
+    b = _model_dir(tmp_path, "b", '{"model_max_length": 8192}')
+    c = _model_dir(tmp_path, "c", '{"model_max_length": 512}')
+    assert _fingerprint(a) == _fingerprint(b)
+    assert _fingerprint(a) != _fingerprint(c)
+
+
+def test_fingerprint_requires_vocab_file(tmp_path):
+    path = tmp_path / "config-only"
+    path.mkdir()
+    (path / "tokenizer_config.json").write_text("{}")
+    assert _fingerprint(str(path)) is None
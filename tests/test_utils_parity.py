@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import filecmp
+import os
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IGNORE = ["__pycache__"]
+
+
+def _files(root: str):
+    found = set()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in _IGNORE]
+        found.update(os.path.relpath(os.path.join(dirpath, name), root) for name in filenames)
+    return found
+
+
+@pytest.mark.parametrize("relpath", ["utils", "config/loader.py"])
+def test_shared_code_is_identical(relpath):
+    # 合并部署时 embedding/ 在 sys.path 中靠前，会静默遮蔽 rerank/ 下的同名模块，两份必须逐字节一致
+    left = os.path.join(_ROOT, "embedding", relpath)
+    right = os.path.join(_ROOT, "rerank", relpath)
+    if os.path.isfile(left):
+        assert filecmp.cmp(left, right, shallow=False), f"{relpath} 在 embedding/ 与 rerank/ 中不一致"
+        return
+    left_files, right_files = _files(left), _files(right)
+    differences = sorted(left_files ^ right_files)
+    for name in sorted(left_files & right_files):
+        if not filecmp.cmp(os.path.join(left, name), os.path.join(right, name), shallow=False):
+            differences.append(name)
+    assert not differences, f"embedding/{relpath} 与 rerank/{relpath} 不一致：{differences}"